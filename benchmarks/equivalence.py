@@ -0,0 +1,101 @@
+import os
+import sys
+import random
+import argparse
+import tempfile
+
+# Checks that the incremental leaderboard updates agree with a full recompute (Set.calculateRankings) after random
+# adds, removes, rescorings, refreshes, player merges and tag changes on synthetic data. Exits with 1 on the first mismatch.
+# Run from the repository root: python benchmarks/equivalence.py [--steps 500] [--seed 0]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+from hypestrankings import config, storage, model
+
+SCORINGS = [[15, 12, 10, 8, 5, 5, 3, 3], [10, 8, 6, 4], [25, 18, 15, 12, 10, 8, 6, 4, 2, 1],
+	{'points': [10, 8, 6], 'tiers': [{'tag': 'major', 'multiplier': 2}, {'minEntrants': 16, 'points': [20, 15, 10, 5], 'multiplier': 1.5}]}]
+
+def recomputed(s):	# (rankings, placements, ordered leaderboard) of a full recompute, leaving s itself untouched
+	full = model.Set(s.name, s.scoring)
+	full.tournaments = dict(s.tournaments)
+	full.calculateRankings()
+	return full.rankings, full.placements, full.rankIndex.slice()
+
+def check(s, step, action):
+	if not s.rankingsValid:	# nothing incremental to compare until the leaderboard is read
+		s.returnRankings()
+		return True
+	rankings, placements, leaderboard = recomputed(s)
+	if s.rankings != rankings or s.placements != placements or s.rankIndex.slice() != leaderboard:
+		print('step {}: {} of {} disagrees with a full recompute'.format(step, action, s.name), file=sys.stderr)
+		return False
+	return True
+
+def shuffled(data, r):	# the same tournament with some placings swapped, as a refresh would fetch it
+	t, participants = data
+	participants = [dict(p) for p in participants]
+	for i in range(r.randint(1, 3)):
+		a, b = r.sample(participants, 2)
+		a['final-rank'], b['final-rank'] = b['final-rank'], a['final-rank']
+	return dict(t, **{'updated-at': '{}-{}'.format(t['updated-at'], r.random())}), participants
+
+def step(r, data, urls, players):	# one random mutation, returns its name
+	s = r.choice(list(model.setDict.values()))
+	action = r.choice(['add', 'add', 'remove', 'rescore', 'refresh', 'merge', 'tag', 'reload'])
+	if action == 'add':
+		s.addFetchedTournaments([url for url in r.sample(urls, 3) if url not in s.tournaments], data)
+	elif action == 'remove' and len(s.tournaments) > 0:
+		s.removeTournament(r.choice(list(s.tournaments)))
+	elif action == 'rescore':
+		s.setScoring(r.choice(SCORINGS))
+	elif action == 'refresh' and len(model.tournamentDict) > 0:
+		url = r.choice(list(model.tournamentDict))
+		data[url] = shuffled(data[url], r)
+		model.applyRefresh({url: data[url]})
+	elif action == 'merge':
+		model.mergePlayers(r.choice(players[50:]), r.choice(players[:50]))
+	elif action == 'tag' and len(model.tournamentDict) > 0:
+		model.tournamentDict[r.choice(list(model.tournamentDict))].setTags(r.choice([[], ['major']]))
+	elif action == 'reload':
+		model.loadData()
+	return action
+
+def main():
+	p = argparse.ArgumentParser()
+	p.add_argument('--tournaments', type=int, default=200)
+	p.add_argument('--players', type=int, default=1000)
+	p.add_argument('--entrants', type=int, default=24)
+	p.add_argument('--sets', type=int, default=3)
+	p.add_argument('--steps', type=int, default=300)
+	p.add_argument('--seed', type=int, default=0)
+	args = p.parse_args()
+	r = random.Random(args.seed)
+	data = synthetic.appData(synthetic.generate(args.tournaments, args.players, args.entrants, seed=args.seed))
+	urls = list(data)
+	players = ['player{}'.format(i) for i in range(args.players)]
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory() as folder:
+		os.chdir(folder)	# the app keeps its database and config under ./userdata
+		try:
+			for lazy in (False, True):
+				config.setLazyLoad(lazy)
+				model.deleteData()
+				model.loadData()
+				for i in range(args.sets):
+					model.newSet('Set {}'.format(i)).addFetchedTournaments(r.sample(urls, 20), data)
+				for i in range(args.steps):
+					action = step(r, data, urls, players)
+					for s in list(model.setDict.values()):
+						if not check(s, i, action):
+							return 1
+				print('{} steps agree ({} loading)'.format(args.steps, 'lazy' if lazy else 'eager'), file=sys.stderr)
+		finally:
+			storage.close()
+			os.chdir(cwd)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
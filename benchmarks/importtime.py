@@ -0,0 +1,44 @@
+import subprocess
+import sys
+import os
+import argparse
+
+# Fails if importing the core package gets slower than the budget or starts pulling in Qt or the http client.
+# Run from the repository root: python benchmarks/importtime.py [--budget MS]
+
+MODULES = ['hypestrankings', 'hypestrankings.cli']
+FORBIDDEN = ['PyQt5', 'challonge', 'http.client']
+
+def measure(module, runs):
+	code = ('import sys, time; t = time.perf_counter(); import {}; t = time.perf_counter() - t; '
+		'print(t, *[m for m in {!r} if m in sys.modules])').format(module, FORBIDDEN)
+	best = None
+	loaded = []
+	for i in range(runs):
+		out = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, check=True,
+			cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), universal_newlines=True).stdout.split()
+		if best is None or float(out[0]) < best:
+			best = float(out[0])
+		loaded = out[1:]
+	return best * 1000, loaded
+
+def main():
+	p = argparse.ArgumentParser()
+	p.add_argument('--budget', type=float, default=100, help='milliseconds allowed per module import')
+	p.add_argument('--runs', type=int, default=5)
+	args = p.parse_args()
+	failed = False
+	for module in MODULES:
+		ms, loaded = measure(module, args.runs)
+		status = 'ok'
+		if ms > args.budget:
+			status = 'over budget'
+			failed = True
+		if len(loaded) > 0:
+			status = 'imports {}'.format(', '.join(loaded))
+			failed = True
+		print('{:<24} {:8.1f} ms  {}'.format(module, ms, status))
+	return 1 if failed else 0
+
+if __name__ == '__main__':
+	sys.exit(main())
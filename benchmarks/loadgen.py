@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from concurrent.futures import ProcessPoolExecutor
+
+# Load test of the serve command: builds synthetic sets in a temporary folder, starts the server on them in its own process
+# and polls it from many keep-alive clients sending If-None-Match like overlays do, optionally changing a set while it runs.
+# Run from the repository root: python benchmarks/loadgen.py [--clients 200 --duration 10 --mutate 2] [--output results.json]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+from hypestrankings import model, storage
+
+def percentile(values, p):
+	if len(values) == 0:
+		return None
+	return sorted(values)[min(len(values) - 1, int(len(values) * p))]
+
+def poll(port, paths, clients, duration, seed):	# runs clients threads in one process, returns ([seconds], {status: count})
+	latencies = []
+	statuses = {}
+	lock = threading.Lock()
+	stop = time.monotonic() + duration
+	def client(i):
+		r = random.Random(seed * 1000 + i)
+		conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+		etags = {}
+		mine = []
+		counts = {}
+		while time.monotonic() < stop:
+			path = r.choice(paths)
+			headers = {'If-None-Match': etags[path]} if path in etags else {}
+			start = time.perf_counter()
+			conn.request('GET', path, headers=headers)
+			response = conn.getresponse()
+			response.read()
+			mine.append(time.perf_counter() - start)
+			counts[response.status] = counts.get(response.status, 0) + 1
+			if response.getheader('ETag') is not None:
+				etags[path] = response.getheader('ETag')
+		conn.close()
+		with lock:
+			latencies.extend(mine)
+			for status, n in counts.items():
+				statuses[status] = statuses.get(status, 0) + n
+	threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	return latencies, statuses
+
+def build(args):	# synthetic sets saved to ./userdata, returns the paths clients poll
+	data = synthetic.appData(synthetic.generate(args.tournaments, args.players, args.entrants, seed=args.seed))
+	urls = list(data)
+	for i in range(args.sets):
+		model.newSet('Set {}'.format(i)).addFetchedTournaments(urls[i::args.sets], data)
+	players = [name for name, points in model.setDict['Set 0'].returnRankings(0, 50)]
+	paths = ['/sets/Set%20{}?stop=100'.format(i) for i in range(args.sets)] * 4 + ['/sets']	# overlays mostly poll the top of a leaderboard
+	paths += ['/tournaments/' + url for url in urls[-10:]] + ['/players/' + name for name in players[:10]]
+	storage.close()
+	return paths
+
+def mutate(interval, stopped, changes):	# toggles the scoring of a set, the server sees the commit and drops what it cached for it
+	s = model.setDict['Set 0']
+	scorings = [list(s.scoring), [x + 1 for x in s.scoring]]
+	while not stopped.wait(interval):
+		s.setScoring(scorings[changes[0] % 2])
+		changes[0] += 1
+
+def serverMetrics(port):	# {name: value} of the server's counters
+	conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+	conn.request('GET', '/metrics')
+	text = conn.getresponse().read().decode()
+	conn.close()
+	values = {}
+	for line in text.splitlines():
+		if line.startswith('hypestrankings_server_cache_total'):
+			name, value = line.rsplit(' ', 1)
+			values[name[len('hypestrankings_'):]] = float(value)
+	return values
+
+def main():
+	p = argparse.ArgumentParser()
+	p.add_argument('--tournaments', type=int, default=200)
+	p.add_argument('--players', type=int, default=5000)
+	p.add_argument('--entrants', type=int, default=32)
+	p.add_argument('--sets', type=int, default=4)
+	p.add_argument('--clients', type=int, default=100, help='concurrent keep-alive connections')
+	p.add_argument('--processes', type=int, default=4, help='processes the clients are spread over')
+	p.add_argument('--duration', type=float, default=10, help='seconds to poll for')
+	p.add_argument('--mutate', type=float, default=0, metavar='SECONDS', help='change a set every SECONDS while polling, 0 for never')
+	p.add_argument('--port', type=int, default=8765)
+	p.add_argument('--seed', type=int, default=0)
+	p.add_argument('--output', help='write the json results here instead of stdout')
+	args = p.parse_args()
+	output = os.path.abspath(args.output) if args.output is not None else None
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory() as folder:
+		os.chdir(folder)	# the app keeps its database under ./userdata
+		server = None
+		try:
+			paths = build(args)
+			env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+			server = subprocess.Popen([sys.executable, '-m', 'hypestrankings', 'serve', '--port', str(args.port), '--reload', '0.5'], env=env)
+			for i in range(100):
+				try:
+					serverMetrics(args.port)
+					break
+				except OSError:
+					time.sleep(0.1)
+			model.loadData()
+			stopped = threading.Event()
+			changes = [0]
+			if args.mutate > 0:
+				threading.Thread(target=mutate, args=(args.mutate, stopped, changes), daemon=True).start()
+			start = time.perf_counter()
+			latencies = []
+			statuses = {}
+			share = [args.clients // args.processes + (1 if i < args.clients % args.processes else 0) for i in range(args.processes)]
+			with ProcessPoolExecutor(max_workers=args.processes) as executor:
+				futures = [executor.submit(poll, args.port, paths, n, args.duration, i) for i, n in enumerate(share) if n > 0]
+				for future in futures:
+					l, s = future.result()
+					latencies += l
+					for status, n in s.items():
+						statuses[status] = statuses.get(status, 0) + n
+			elapsed = time.perf_counter() - start
+			stopped.set()
+			cache = serverMetrics(args.port)
+		finally:
+			if server is not None:
+				server.terminate()
+				server.wait()
+			storage.close()
+			os.chdir(cwd)
+	report = {'clients': args.clients, 'duration': elapsed, 'requests': len(latencies), 'perSecond': len(latencies) / elapsed,
+		'statuses': {str(status): n for status, n in sorted(statuses.items())}, 'changes': changes[0], 'cache': cache,
+		'latency': {'p50': percentile(latencies, 0.5), 'p90': percentile(latencies, 0.9), 'p99': percentile(latencies, 0.99), 'max': max(latencies, default=None)}}
+	print('{} requests in {:.1f} s, {:.0f}/s, p50 {:.2f} ms, p99 {:.2f} ms'.format(report['requests'], elapsed, report['perSecond'],
+		(report['latency']['p50'] or 0) * 1000, (report['latency']['p99'] or 0) * 1000), file=sys.stderr)
+	if output is not None:
+		with open(output, 'w') as f:
+			json.dump(report, f, indent=1)
+	else:
+		print(json.dumps(report, indent=1))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# Times the data paths of hypestrankings on synthetic data and prints the results as json for comparing commits.
+# Fetches go to a local stub of the challonge api, everything else runs in a temporary folder.
+# Run from the repository root: python benchmarks/suite.py [--tournaments 5000 --players 100000] [--output results.json]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+from hypestrankings import config, storage, fetch, model
+from hypestrankings.client import TokenBucket
+from hypestrankings.export import exportCSV, exportSets
+
+results = {}
+
+def timed(name, function, repeat=1, **extra):	# best of repeat runs, returns the last result
+	best = None
+	for i in range(repeat):
+		start = time.perf_counter()
+		value = function()
+		seconds = time.perf_counter() - start
+		if best is None or seconds < best:
+			best = seconds
+	results[name] = dict(seconds=best, repeat=repeat, **extra)
+	print('{:<28} {:10.2f} ms'.format(name, best * 1000), file=sys.stderr)
+	return value
+
+def commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+			stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip() or None
+	except OSError:
+		return None
+
+def benchmarkFetch(data, urls):
+	fetched, errors = timed('fetch.cold', lambda: model.fetchTournaments(urls), tournaments=len(urls))
+	if len(errors) > 0:
+		raise SystemExit('fetch failed: {}'.format(next(iter(errors.values()))))
+	timed('fetch.cached', lambda: model.fetchTournaments(urls), tournaments=len(urls))
+	return fetched
+
+def benchmarkBuild(app, fetched, sets):
+	names = ['Set {}'.format(i) for i in range(sets)]
+	urls = list(app)
+	def build():
+		for i, name in enumerate(names):
+			s = model.newSet(name)
+			mine = urls[i::sets]
+			s.addFetchedTournaments(mine, {url: fetched.get(url, app[url]) for url in mine})
+	timed('build', build, tournaments=len(urls), sets=sets)
+	def rewrite():
+		for t in model.tournamentDict.values():
+			storage.tournamentChanged(t)
+		model.saveData()
+	timed('saveData', rewrite, tournaments=len(urls), bytes=os.path.getsize(storage.dbPath))
+
+def benchmarkLoad(repeat):
+	config.setLazyLoad(False)
+	timed('loadData.eager', model.loadData, repeat)
+	config.setLazyLoad(True)
+	timed('loadData.lazy', model.loadData, repeat)
+	sets = list(model.setDict.values())
+	def calculate():
+		for s in sets:
+			s.calculateRankings()
+	timed('calculateRankings.cold', calculate)
+	timed('calculateRankings.warm', calculate, repeat)
+	timed('rankAllSets', model.rankAllSets, repeat)
+	timed('rankAllSets.processes', lambda: model.rankAllSets(processes=4), repeat)
+	timed('returnRankings.full', lambda: [s.returnRankings() for s in sets], repeat)
+	timed('returnRankings.page', lambda: [s.returnRankings(0, 200) for s in sets], repeat)
+	timed('rankingsAt', lambda: [s.rankingsAt() for s in sets], repeat)
+	players = [name for name, points in sets[0].returnRankings(0, 1000)]
+	timed('playerStats', lambda: [sets[0].playerStats(name) for name in players], repeat, players=len(players))
+	timed('playerIndex.build', model.playerIndex.build)
+	timed('playerPlacements', lambda: [model.playerPlacements(name) for name in players], repeat, players=len(players))
+
+def benchmarkExport(repeat):
+	sets = list(model.setDict.values())
+	timed('exportCSV', lambda: [exportCSV('export/', '{}.csv'.format(s.name), s) for s in sets], repeat)
+	timed('exportSets', lambda: exportSets(sets, 'export/', ['csv', 'jsonl']), repeat)
+	timed('exportSets.processes', lambda: exportSets(sets, 'export/', ['csv', 'jsonl'], processes=4), repeat)
+
+def benchmarkRatings():
+	from hypestrankings.ratings import updateRatings
+	s = next(iter(model.setDict.values()))
+	timed('ratings.full', lambda: updateRatings(s), tournaments=len(s.tournaments))
+	timed('ratings.unchanged', lambda: updateRatings(s))
+
+def benchmarkGUI(repeat):	# widget population, only when PyQt5 is installed
+	try:
+		os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+		from PyQt5.QtWidgets import QApplication, QListWidget, QListWidgetItem
+		sys.path.insert(0, ROOT)
+		from leaderboard import LeaderboardModel
+	except ImportError:
+		results['gui'] = {'skipped': 'PyQt5 is not installed'}
+		print('{:<28} skipped, PyQt5 is not installed'.format('gui'), file=sys.stderr)
+		return
+	app = QApplication.instance() or QApplication([])
+	s = next(iter(model.setDict.values()))
+	listWidget = QListWidget()
+	def fillList():
+		listWidget.clear()
+		for url in s.tournaments:
+			listWidget.addItem(QListWidgetItem(url))
+	timed('gui.tournamentList', fillList, repeat, rows=len(s.tournaments))
+	leaderboard = LeaderboardModel()
+	rankings = s.returnRankings()
+	def fillTable():
+		leaderboard.load(['Player', 'Points'], [r[0] for r in rankings], lambda name, column: name)
+		while leaderboard.canFetchMore():
+			leaderboard.fetchMore()
+	timed('gui.leaderboard', fillTable, repeat, rows=len(rankings))
+
+def main():
+	p = argparse.ArgumentParser()
+	p.add_argument('--tournaments', type=int, default=100)
+	p.add_argument('--players', type=int, default=2000)
+	p.add_argument('--entrants', type=int, default=32, help='participants per tournament')
+	p.add_argument('--sets', type=int, default=4, help='sets the tournaments are split between')
+	p.add_argument('--fetch', type=int, default=100, help='tournaments fetched through the stub server, the rest are added directly')
+	p.add_argument('--rate', type=float, default=1000, help='client requests per second, challonge allows about 10')
+	p.add_argument('--repeat', type=int, default=3, help='runs of each repeatable benchmark, the best is kept')
+	p.add_argument('--seed', type=int, default=0)
+	p.add_argument('--output', help='write the json results here instead of stdout')
+	args = p.parse_args()
+	scale = dict(tournaments=args.tournaments, players=args.players, entrants=args.entrants, sets=args.sets, fetch=min(args.fetch, args.tournaments))
+	data = timed('generate', lambda: synthetic.generate(args.tournaments, args.players, args.entrants, seed=args.seed))
+	app = synthetic.appData(data)
+	output = os.path.abspath(args.output) if args.output is not None else None
+	server = synthetic.StubServer(data).start()
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory() as folder:
+		os.chdir(folder)	# the app keeps its database, cache and config under ./userdata
+		try:
+			fetch.setBaseUrl(server.url)
+			fetch.api().bucket = TokenBucket(args.rate, args.rate)
+			fetched = benchmarkFetch(data, list(data)[:scale['fetch']])
+			benchmarkBuild(app, fetched, args.sets)
+			benchmarkLoad(args.repeat)
+			benchmarkExport(args.repeat)
+			benchmarkRatings()
+			benchmarkGUI(args.repeat)
+			results['requests'] = {'count': server.requests}
+		finally:
+			storage.close()
+			fetch.setBaseUrl(None)
+			server.stop()
+			os.chdir(cwd)
+	report = {'commit': commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+		'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'scale': scale, 'results': results}
+	if output is not None:
+		with open(output, 'w') as f:
+			json.dump(report, f, indent=1)
+	else:
+		print(json.dumps(report, indent=1))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,122 @@
+import json
+import math
+import random
+import datetime
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Synthetic challonge data and a local stub of the challonge api serving it, used by suite.py.
+# Records use challonge's json field names, the client turns them into the hyphenated ones the app uses.
+
+def finalRank(position):	# double elimination placings: 1, 2, 3, 4, 5, 5, 7, 7, 9 x4, 13 x4, 17 x8...
+	if position < 4:
+		return position + 1
+	power = 2 ** int(math.log2(position))
+	if position < power + power // 2:
+		return power + 1
+	return power + power // 2 + 1
+
+def generate(tournaments=100, players=1000, entrants=32, guests=0.1, seed=0):	# {url: (tournament, [participant], [match])}
+	r = random.Random(seed)
+	weights = list(itertools.accumulate(1 / (i + 1) for i in range(players)))	# a few regulars attend most events, most players only a few
+	names = ['player{}'.format(i) for i in range(players)]
+	start = datetime.datetime(2020, 1, 1, 19, tzinfo=datetime.timezone(datetime.timedelta(hours=-5)))
+	data = {}
+	participantId = 0
+	for i in range(tournaments):
+		url = 'synthetic{}'.format(i)
+		count = min(entrants, players)
+		attending = []
+		seen = set()
+		while len(attending) < count:
+			player = r.choices(range(players), cum_weights=weights, k=count - len(attending))
+			for p in player:
+				if p not in seen:
+					seen.add(p)
+					attending.append(p)
+		played = start + datetime.timedelta(days=7 * i)
+		t = {'id': i + 1, 'url': url, 'name': 'Synthetic {}'.format(i), 'state': 'complete',
+			'started_at': played.isoformat(), 'completed_at': (played + datetime.timedelta(hours=4)).isoformat(),
+			'updated_at': (played + datetime.timedelta(hours=4)).isoformat(), 'participants_count': count}
+		participants = []
+		for position, p in enumerate(attending):
+			participantId += 1
+			guest = r.random() < guests
+			participants.append({'id': participantId, 'tournament_id': i + 1, 'final_rank': finalRank(position),
+				'challonge_username': None if guest else names[p], 'name': names[p].title() if guest else '', 'display_name': names[p]})
+		matches = []
+		for m in range(count - 1):
+			a, b = r.sample(participants, 2)
+			winner, loser = (a, b) if a['final_rank'] <= b['final_rank'] else (b, a)
+			matches.append({'id': m + 1, 'tournament_id': i + 1, 'state': 'complete', 'round': 1,
+				'player1_id': a['id'], 'player2_id': b['id'], 'winner_id': winner['id'], 'loser_id': loser['id'],
+				'completed_at': t['completed_at']})
+		data[url] = (t, participants, matches)
+	return data
+
+def appData(data):	# the same data as the app sees it after fetching, for building sets without the network
+	def hyphenate(record):
+		return {key.replace('_', '-'): value for key, value in record.items()}
+	return {url: (hyphenate(t), [hyphenate(p) for p in participants]) for url, (t, participants, matches) in data.items()}
+
+class StubServer:	# serves the tournaments.show, participants.index and matches.index endpoints on 127.0.0.1
+	def __init__(self, data, port=0):
+		byId = {t['id']: (t, participants, matches) for t, participants, matches in data.values()}
+		self.requests = 0
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+			disable_nagle_algorithm = True	# headers and body are written separately
+
+			def log_message(self, *args):
+				pass
+
+			def do_GET(self):
+				server.requests += 1
+				parts = self.path.split('?')[0].strip('/').split('/')
+				body = None
+				if len(parts) >= 2 and parts[-2] == 'tournaments' and parts[-1].endswith('.json'):
+					url = parts[-1][:-5]
+					if url in data:
+						body = {'tournament': data[url][0]}
+				elif len(parts) >= 3 and parts[-3] == 'tournaments' and parts[-2].isdigit():
+					entry = byId.get(int(parts[-2]))
+					if entry is not None and parts[-1] == 'participants.json':
+						body = [{'participant': p} for p in entry[1]]
+					elif entry is not None and parts[-1] == 'matches.json':
+						body = [{'match': m} for m in entry[2]]
+				if body is None:
+					self.reply(404, b'')
+					return
+				etag = '"{}"'.format(hash(self.path) & 0xffffffff)
+				if self.headers.get('If-None-Match') == etag:
+					self.reply(304, b'', etag)
+					return
+				self.reply(200, json.dumps(body).encode(), etag)
+
+			def reply(self, status, blob, etag=None):
+				self.send_response(status)
+				if etag is not None:
+					self.send_header('ETag', etag)
+				self.send_header('Content-Type', 'application/json')
+				self.send_header('Content-Length', str(len(blob)))
+				self.end_headers()
+				self.wfile.write(blob)
+
+		self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+		self.httpd.daemon_threads = True
+		self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+	@property
+	def url(self):
+		return 'http://127.0.0.1:{}/v1/'.format(self.httpd.server_address[1])
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.httpd.shutdown()
+		self.httpd.server_close()
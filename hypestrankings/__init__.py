@@ -0,0 +1,5 @@
+from .model import (DEFAULT_SCORING, setDict, tournamentDict, Set, Tournament, RankIndex, newSet,
+	saveData, loadData, deleteData, loadConfig, refreshTournaments, rankAllSets,
+	mergePlayers, similarPlayers, mergeSuggestions, playerPlacements, playerAttendance, bestFinishes, playerSets,
+	searchPlayers, headToHead)
+from .export import exportCSV, exportSets
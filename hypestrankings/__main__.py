@@ -0,0 +1,4 @@
+import sys
+from hypestrankings.cli import main
+
+sys.exit(main())
@@ -0,0 +1,67 @@
+import os
+import time
+import pickle
+import hashlib
+import threading
+from . import metrics
+
+cachePath = 'userdata/cache/'
+maxSize = 64 * 1024 * 1024	# bytes
+ttl = 60 * 60	# seconds before a mutable response has to be revalidated
+
+lock = threading.Lock()
+totalSize = None	# worked out from the cache folder on first write
+
+def entryPath(endpoint, key):
+	return cachePath + hashlib.sha1('{}:{}'.format(endpoint, key).encode()).hexdigest() + '.pickle'
+
+def get(endpoint, key):
+	try:
+		with open(entryPath(endpoint, key), 'rb') as f:
+			entry = pickle.load(f)
+	except (OSError, EOFError, pickle.UnpicklingError):
+		metrics.count('cache_lookups_total', endpoint=endpoint, result='miss')
+		return None
+	metrics.count('cache_lookups_total', endpoint=endpoint, result='hit')
+	entry.setdefault('etag', None)
+	return entry
+
+def isFresh(entry):
+	return entry['immutable'] or time.time() - entry['stored'] < ttl
+
+def put(endpoint, key, data, immutable=False, validator=None, etag=None):	# completed tournaments are stored as immutable and never fetched again
+	global totalSize
+	entry = {'stored': time.time(), 'immutable': immutable, 'validator': validator, 'etag': etag, 'data': data}
+	blob = pickle.dumps(entry, pickle.HIGHEST_PROTOCOL)
+	path = entryPath(endpoint, key)
+	with lock:
+		if not os.path.isdir(cachePath):
+			os.makedirs(cachePath)
+		if totalSize is None:
+			totalSize = sum(os.path.getsize(cachePath + f) for f in os.listdir(cachePath))
+		if os.path.isfile(path):
+			totalSize -= os.path.getsize(path)
+		with open(path + '.tmp', 'wb') as f:
+			f.write(blob)
+		os.replace(path + '.tmp', path)
+		totalSize += len(blob)
+		if totalSize > maxSize:
+			evict(path)
+
+def evict(keep):	# drops least recently written entries until the cache fits again
+	global totalSize
+	entries = sorted((os.path.getmtime(cachePath + f), cachePath + f) for f in os.listdir(cachePath))
+	for mtime, path in entries:
+		if totalSize <= maxSize:
+			break
+		if path != keep:
+			totalSize -= os.path.getsize(path)
+			os.remove(path)
+
+def clear():
+	global totalSize
+	with lock:
+		if os.path.isdir(cachePath):
+			for f in os.listdir(cachePath):
+				os.remove(cachePath + f)
+		totalSize = 0
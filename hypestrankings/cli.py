@@ -0,0 +1,338 @@
+import argparse
+import sys
+import datetime
+import urllib.error
+from . import config
+from . import metrics
+from .model import (setDict, tournamentDict, newSet, refreshTournaments, rankAllSets, mergePlayers, similarPlayers, mergeSuggestions,
+	playerPlacements, playerSets, searchPlayers, headToHead, loadConfig, loadData, saveSnapshots)
+from .fetch import httpErrorMessage, parseTime
+from .tiers import parseScoring
+from .export import DEFAULT_CSV_PATH, FORMATS, exportCSV, exportSets
+
+def printError(url, e):
+	if isinstance(e, urllib.error.HTTPError):
+		print('{}: {}'.format(url, httpErrorMessage(e)), file=sys.stderr)
+	else:
+		print('{}: {}'.format(url, str(e)), file=sys.stderr)
+
+def progress(url, error, done, total):
+	if error is None:
+		print('[{}/{}] {}'.format(done, total, url), file=sys.stderr)
+	else:
+		printError(url, error)
+
+def selectSets(names):
+	if len(names) == 0:
+		return list(setDict.values())
+	for name in names:
+		if name not in setDict:
+			raise SystemExit('No set named {}'.format(name))
+	return [setDict[name] for name in names]
+
+def build(args):	# creates each set if needed and adds its tournaments in one bulk import per set
+	failed = 0
+	for spec in args.set:
+		name, urls = spec[0], spec[1:]
+		if name in setDict:
+			set = setDict[name]
+		else:
+			set = newSet(name)
+		if args.scoring is not None:
+			set.setScoring(parseScoring(args.scoring))
+		print('{}: adding {} tournaments'.format(name, len(urls)), file=sys.stderr)
+		failed += len(set.addTournaments(urls, progress))
+	return 1 if failed > 0 else 0
+
+def export(args):
+	path = args.path
+	if path is None:
+		if 'settings' in config.config and 'csvpath' in config.config['settings']:
+			path = config.config['settings']['csvpath']
+		else:
+			path = DEFAULT_CSV_PATH
+	if path[len(path) - 1] != '/':
+		path = path + '/'
+	if args.format is None:
+		for set in selectSets(args.sets):
+			exportCSV(path, '{}.csv'.format(set.name), set)
+			print('{}{}.csv'.format(path, set.name))
+		return 0
+	failed = 0
+	for name, result in exportSets(selectSets(args.sets), path, args.format.split(','), args.processes).items():
+		if isinstance(result, Exception):
+			print('{}: {}'.format(name, str(result)), file=sys.stderr)
+			failed += 1
+		else:
+			for filename in result:
+				print(filename)
+	return 1 if failed > 0 else 0
+
+def refresh(args):
+	urls = []
+	for set in selectSets(args.sets):
+		for url in set.tournaments:
+			if url not in urls:
+				urls.append(url)
+	diffs, errors = refreshTournaments(urls, progress)
+	for name, diff in diffs.items():
+		print('{}: {} rank changes'.format(name, len(diff)))
+		for player, old, new in diff:
+			print('  {}: {} -> {}'.format(player, old or '-', new or '-'))
+	return 1 if len(errors) > 0 else 0
+
+def compare(args):
+	from .scoring import compareScorings
+	set = selectSets([args.set])[0]
+	if not set.rule.flat:
+		raise SystemExit('{} uses tiered scoring, compare only works with flat scorings'.format(set.name))
+	scorings = [set.rule.default] + [[int(x) for x in scoring.split(',')] for scoring in args.scoring]
+	tops, movement = compareScorings(set, scorings, args.top)
+	labels = ['current'] + args.scoring
+	print('\t'.join(['#'] + labels))
+	for i in range(args.top):
+		row = [str(i + 1)]
+		for top in tops:
+			if i < len(top):
+				row.append('{} ({})'.format(top[i][0], top[i][1]))
+			else:
+				row.append('')
+		print('\t'.join(row))
+	print()
+	print('\t'.join(['Player'] + labels))
+	for player, ranks in sorted(movement.items(), key=lambda x: x[1]):
+		print('\t'.join([player] + [str(r) for r in ranks]))
+	return 0
+
+def rank(args):
+	total, seconds = rankAllSets(selectSets(args.sets), args.processes)
+	for name, elapsed in seconds.items():
+		print('{}\t{} players\t{:.1f} ms'.format(name, len(setDict[name].rankings), elapsed * 1000))
+	print('total\t{} sets\t{:.1f} ms'.format(len(seconds), total * 1000))
+	return 0
+
+def rankings(args):
+	set = selectSets([args.set])[0]
+	end = None
+	if args.at is not None:
+		end = parseTime(args.at)	# naive utc like the tournament times it's compared with
+		if end is None:
+			raise SystemExit('Invalid date {}'.format(args.at))
+	if args.half_life is not None:
+		rankings = set.decayedRankings(args.half_life, end, args.window, 0, args.top)
+	elif args.window is not None:
+		rankings = set.windowedRankings(args.window, end, 0, args.top)
+	else:
+		rankings = set.returnRankings(0, args.top)
+	for i, (player, points) in enumerate(rankings):
+		print('{}\t{}\t{}'.format(i + 1, player, points))
+	return 0
+
+def history(args):	# the leaderboard as saved at a time, or how players moved since some days ago
+	set = selectSets([args.set])[0]
+	if args.since is not None:
+		since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=args.since)
+		for player, old, new, was, points in set.movementSince(since)[:args.top]:
+			if old is None:
+				change = 'new'
+			elif new is None:
+				change = 'out'
+			else:
+				change = '{:+d}'.format(old - new)
+			print('{}\t{}\t{}\t{}'.format(new or '-', change, player, was if points is None else points))
+		return 0
+	at = None
+	if args.at is not None:
+		at = parseTime(args.at)	# naive utc like the stored snapshot times
+		if at is None:
+			raise SystemExit('Invalid date {}'.format(args.at))
+	for i, (player, points) in enumerate(set.rankingsAt(at, 0, args.top)):
+		print('{}\t{}\t{}'.format(i + 1, player, points))
+	return 0
+
+def ratings(args):
+	from .ratings import updateRatings
+	set = selectSets([args.set])[0]
+	ratings, errors = updateRatings(set, progress)
+	for i, (player, rating, deviation) in enumerate(ratings.ratings()[:args.top]):
+		print('{}\t{}\t{:.0f}\t{:.0f}'.format(i + 1, player, rating, deviation))
+	return 1 if len(errors) > 0 else 0
+
+def player(args):
+	name = args.player
+	placements = playerPlacements(name)
+	if len(placements) == 0:
+		matches = searchPlayers(name, 10)
+		if len(matches) != 1:
+			print('No player named {}{}'.format(name, '' if len(matches) == 0 else ', did you mean ' + ', '.join(matches)), file=sys.stderr)
+			return 1
+		name = matches[0]
+		placements = playerPlacements(name)
+	print('{}: {} events'.format(name, len(placements)))
+	for setName, (points, events, best) in playerSets(name).items():
+		print('  {}: {} points, {} events, best {}'.format(setName, points, events, best))
+	for url, rank in placements[:args.top]:
+		print('{}\t{}'.format(rank, url))
+	if args.against is not None:
+		wins, losses, draws = headToHead(name, args.against)
+		print('vs {}: {}-{}{}'.format(args.against, wins, losses, '-{}'.format(draws) if draws > 0 else ''))
+	return 0
+
+def tag(args):
+	if args.url not in tournamentDict:
+		raise SystemExit('No tournament {}'.format(args.url))
+	t = tournamentDict[args.url]
+	if len(args.tags) > 0 or args.clear:
+		t.setTags(args.tags)
+	print('{}: {}'.format(t.url, ', '.join(sorted(t.tags)) or 'no tags'))
+	return 0
+
+def alias(args):
+	for name in args.aliases:
+		mergePlayers(name, args.player)
+		print('{} -> {}'.format(name, args.player))
+	return 0
+
+def suggest(args):	# likely duplicate players, merge them with the alias command
+	if args.player is not None:
+		matches = [(args.player, other, score) for other, score in similarPlayers(args.player, args.threshold, args.limit)]
+	else:
+		matches = mergeSuggestions(args.threshold, args.limit)
+	for name, other, score in matches:
+		print('{:.2f}\t{}\t{}'.format(score, name, other))
+	return 0
+
+def serve(args):
+	from .server import LeaderboardServer
+	server = LeaderboardServer((args.host, args.port))
+	server.warm()
+	print('Serving leaderboards on http://{}:{}/'.format(*server.server_address[:2]), file=sys.stderr)
+	try:
+		server.serve(args.reload, args.refresh)
+	except KeyboardInterrupt:
+		pass
+	return 0
+
+def listSets(args):
+	for name, set in setDict.items():
+		print('{}\t{} tournaments'.format(name, len(set.tournaments)))
+	return 0
+
+def parser():
+	p = argparse.ArgumentParser(prog='hypestrankings', fromfile_prefix_chars='@',
+		description='Build and export hypestrankings leaderboards without the GUI. '
+		'Arguments starting with @ are read from a file, one per line.')
+	p.add_argument('--metrics', metavar='PATH', help='write timings and counts of the run to PATH, - for stdout')
+	p.add_argument('--metrics-format', choices=['json', 'prometheus'], default='json')
+	commands = p.add_subparsers(dest='command')
+	commands.required = True
+	
+	p_build = commands.add_parser('build', help='create sets and add tournaments to them')
+	p_build.add_argument('--set', action='append', nargs='+', required=True, metavar=('NAME', 'URL'),
+		help='set name followed by challonge urls, can be given once per set (e.g. --set Weekly @weekly.txt)')
+	p_build.add_argument('--scoring', help='comma separated points per placing for the sets, or the json of a tiered scoring')
+	p_build.set_defaults(func=build)
+	
+	p_export = commands.add_parser('export', help='export set leaderboards')
+	p_export.add_argument('sets', nargs='*', metavar='SET', help='sets to export, all sets if omitted')
+	p_export.add_argument('--path', help='folder to write the files to')
+	p_export.add_argument('--format', help='comma separated formats out of {}, writes the classic csv if omitted'.format(', '.join(FORMATS)))
+	p_export.add_argument('--processes', type=int, help='number of processes writing files in parallel')
+	p_export.set_defaults(func=export)
+	
+	p_refresh = commands.add_parser('refresh', help='fetch results again for tournaments that changed')
+	p_refresh.add_argument('sets', nargs='*', metavar='SET', help='sets to refresh, all sets if omitted')
+	p_refresh.set_defaults(func=refresh)
+	
+	p_compare = commands.add_parser('compare', help='compare the top players of a set under different scorings (needs numpy)')
+	p_compare.add_argument('set', metavar='SET')
+	p_compare.add_argument('--scoring', action='append', required=True,
+		help='comma separated points per placing, can be given several times')
+	p_compare.add_argument('--top', type=int, default=10, help='number of top players to compare')
+	p_compare.set_defaults(func=compare)
+	
+	p_rank = commands.add_parser('rank', help='recalculate set leaderboards in one pass over their tournaments and time it')
+	p_rank.add_argument('sets', nargs='*', metavar='SET', help='sets to recalculate, all sets if omitted')
+	p_rank.add_argument('--processes', type=int, help='number of processes summing points in parallel')
+	p_rank.set_defaults(func=rank)
+	
+	p_rankings = commands.add_parser('rankings', help='show a set leaderboard, optionally over a time window or decayed')
+	p_rankings.add_argument('set', metavar='SET')
+	p_rankings.add_argument('--window', type=float, metavar='DAYS', help='only count tournaments played in the last DAYS days')
+	p_rankings.add_argument('--half-life', type=float, metavar='DAYS', help='points halve every DAYS days')
+	p_rankings.add_argument('--at', metavar='DATE', help='rank as of this utc date or time instead of now, e.g. 2024-06-30')
+	p_rankings.add_argument('--top', type=int, default=50, help='number of players to show')
+	p_rankings.set_defaults(func=rankings)
+	
+	p_history = commands.add_parser('history', help='a set leaderboard as it was saved at some time, or rank movement since then')
+	p_history.add_argument('set', metavar='SET')
+	when = p_history.add_mutually_exclusive_group()
+	when.add_argument('--at', metavar='DATE', help='utc date or time to show the leaderboard at, e.g. 2024-06-30T18:00')
+	when.add_argument('--since', type=float, metavar='DAYS', help='show players whose rank changed in the last DAYS days, e.g. 7')
+	p_history.add_argument('--top', type=int, default=50, help='number of players to show')
+	p_history.set_defaults(func=history)
+	
+	p_ratings = commands.add_parser('ratings', help='glicko-2 ratings of a set from the match results of its tournaments')
+	p_ratings.add_argument('set', metavar='SET')
+	p_ratings.add_argument('--top', type=int, default=50, help='number of players to show')
+	p_ratings.set_defaults(func=ratings)
+	
+	p_player = commands.add_parser('player', help='placings of a player across every tournament')
+	p_player.add_argument('player', metavar='PLAYER', help='player name or the start of one')
+	p_player.add_argument('--top', type=int, default=20, help='number of best finishes to show')
+	p_player.add_argument('--against', metavar='OPPONENT', help='also show the head-to-head record from stored match results')
+	p_player.set_defaults(func=player)
+	
+	p_tag = commands.add_parser('tag', help='show or set the tags of a tournament, tiered scorings can pick points by tag')
+	p_tag.add_argument('url', metavar='URL')
+	p_tag.add_argument('tags', nargs='*', metavar='TAG', help='replaces the tags, e.g. major')
+	p_tag.add_argument('--clear', action='store_true', help='remove all tags')
+	p_tag.set_defaults(func=tag)
+	
+	p_alias = commands.add_parser('alias', help='merge players into one, e.g. after a username change or guest entries')
+	p_alias.add_argument('player', metavar='PLAYER', help='player to keep')
+	p_alias.add_argument('aliases', nargs='+', metavar='ALIAS', help='names whose placings become PLAYER\'s')
+	p_alias.set_defaults(func=alias)
+	
+	p_suggest = commands.add_parser('suggest', help='list players with similar names that may be the same person')
+	p_suggest.add_argument('player', nargs='?', metavar='PLAYER', help='only suggest names similar to this player')
+	p_suggest.add_argument('--threshold', type=float, default=0.6, help='minimum similarity between 0 and 1')
+	p_suggest.add_argument('--limit', type=int, default=50, help='maximum number of suggestions')
+	p_suggest.set_defaults(func=suggest)
+	
+	p_serve = commands.add_parser('serve', help='serve leaderboards, tournament results and players as json over http')
+	p_serve.add_argument('--host', default='127.0.0.1', help='address to listen on, 0.0.0.0 for every interface')
+	p_serve.add_argument('--port', type=int, default=8080)
+	p_serve.add_argument('--reload', type=float, default=2, metavar='SECONDS',
+		help='how often to check for changes saved by the gui or other commands, 0 to never reload')
+	p_serve.add_argument('--refresh', type=float, default=0, metavar='SECONDS',
+		help='fetch changed tournaments from challonge every SECONDS, off by default')
+	p_serve.set_defaults(func=serve)
+	
+	p_list = commands.add_parser('list', help='list sets')
+	p_list.set_defaults(func=listSets)
+	return p
+
+def main(argv=None):
+	args = parser().parse_args(argv)
+	loadConfig()
+	try:
+		with metrics.profile(args.command):	# only when a profiler is picked in the settings
+			loadData()
+			status = args.func(args)
+			saveSnapshots()	# history of sets whose leaderboard the command changed without reading it
+			return status
+	finally:
+		if args.metrics is not None:
+			dumpMetrics(args.metrics, args.metrics_format)
+
+def dumpMetrics(path, format):
+	if format == 'prometheus':
+		text = metrics.toPrometheus()
+	else:
+		text = metrics.toJSON() + '\n'
+	if path == '-':
+		sys.stdout.write(text)
+	else:
+		with open(path, 'w') as f:
+			f.write(text)
@@ -0,0 +1,149 @@
+import http.client
+import urllib.parse
+import urllib.error
+import base64
+import json
+import queue
+import random
+import socket
+import threading
+import time
+from collections import deque
+
+DEFAULT_BASE_URL = 'https://api.challonge.com/v1/'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class TokenBucket:	# allows bursts of up to capacity requests, refilled at rate requests per second
+	def __init__(self, rate, capacity):
+		self.rate = rate
+		self.capacity = capacity
+		self.tokens = capacity
+		self.updated = time.monotonic()
+		self.lock = threading.Lock()
+
+	def take(self):
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+				self.updated = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			time.sleep(wait)
+
+class ChallongeClient:	# challonge api v1 over pooled keep-alive connections, rate limited and retrying 429/5xx with backoff
+	def __init__(self, baseUrl=DEFAULT_BASE_URL, rate=10, burst=10, poolSize=8, retries=5, backoff=0.5, timeout=30):
+		parts = urllib.parse.urlsplit(baseUrl)
+		self.scheme = parts.scheme
+		self.host = parts.netloc
+		self.basePath = parts.path.rstrip('/') + '/'
+		self.retries = retries
+		self.backoff = backoff
+		self.timeout = timeout
+		self.authorization = None
+		self.bucket = TokenBucket(rate, burst)
+		self.pool = queue.LifoQueue(poolSize)
+		self.timings = deque(maxlen=1000)	# (endpoint, status, seconds, attempt) of recent requests
+		self.timingListeners = []	# called with the same tuple after every request
+
+	def setCredentials(self, username, apiKey):
+		token = base64.b64encode('{}:{}'.format(username, apiKey).encode()).decode()
+		self.authorization = 'Basic ' + token
+
+	def connection(self):
+		try:
+			return self.pool.get_nowait()
+		except queue.Empty:
+			if self.scheme == 'https':
+				return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+			return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+	def release(self, conn):
+		try:
+			self.pool.put_nowait(conn)
+		except queue.Full:
+			conn.close()
+
+	def request(self, endpoint, path, etag=None):	# returns (json, etag), json is None when etag still matches
+		url = self.basePath + path
+		headers = {'Accept': 'application/json'}
+		if self.authorization is not None:
+			headers['Authorization'] = self.authorization
+		if etag is not None:
+			headers['If-None-Match'] = etag
+		attempt = 0
+		while True:
+			self.bucket.take()
+			conn = self.connection()
+			start = time.perf_counter()
+			try:
+				conn.request('GET', url, headers=headers)
+				response = conn.getresponse()
+				body = response.read()
+			except (http.client.HTTPException, ConnectionError, socket.timeout) as e:
+				conn.close()
+				self.record(endpoint, None, time.perf_counter() - start, attempt)
+				if attempt >= self.retries:
+					raise
+				self.sleep(attempt, None)
+				attempt += 1
+				continue
+			self.record(endpoint, response.status, time.perf_counter() - start, attempt)
+			if response.getheader('Connection', '').lower() == 'close':
+				conn.close()
+			else:
+				self.release(conn)
+			if response.status in RETRY_STATUSES and attempt < self.retries:
+				self.sleep(attempt, response.getheader('Retry-After'))
+				attempt += 1
+				continue
+			if response.status == 304:
+				return None, etag
+			if response.status >= 400:
+				raise urllib.error.HTTPError(self.scheme + '://' + self.host + url, response.status, response.reason, response.headers, None)
+			return json.loads(body.decode('utf-8')), response.getheader('ETag')
+
+	def sleep(self, attempt, retryAfter):	# exponential backoff with full jitter, Retry-After wins if the server sent one
+		delay = random.uniform(0, self.backoff * (2 ** attempt))
+		if retryAfter is not None:
+			try:
+				delay = max(delay, float(retryAfter))
+			except ValueError:
+				pass
+		time.sleep(min(delay, 60))
+
+	def record(self, endpoint, status, seconds, attempt):
+		timing = (endpoint, status, seconds, attempt)
+		self.timings.append(timing)
+		for listener in self.timingListeners:
+			listener(*timing)
+
+	def tournament(self, url, etag=None):
+		data, etag = self.request('tournaments.show', 'tournaments/{}.json'.format(urllib.parse.quote(str(url), safe='')), etag)
+		if data is not None:
+			data = normalize(data['tournament'])
+		return data, etag
+
+	def participants(self, tournamentId, etag=None):
+		data, etag = self.request('participants.index', 'tournaments/{}/participants.json'.format(tournamentId), etag)
+		if data is not None:
+			data = [normalize(p['participant']) for p in data]
+		return data, etag
+
+	def matches(self, tournamentId, etag=None):
+		data, etag = self.request('matches.index', 'tournaments/{}/matches.json'.format(tournamentId), etag)
+		if data is not None:
+			data = [normalize(m['match']) for m in data]
+		return data, etag
+
+	def close(self):
+		while True:
+			try:
+				self.pool.get_nowait().close()
+			except queue.Empty:
+				return
+
+def normalize(record):	# the rest of the code uses the hyphenated keys of challonge's xml format
+	return {key.replace('_', '-'): value for key, value in record.items()}
@@ -0,0 +1,89 @@
+from configparser import ConfigParser
+import os
+
+config = ConfigParser()
+
+configPath = 'userdata/config.ini'
+
+def configExists():
+	if os.path.isfile(configPath):
+		return True
+	else:
+		return False
+		
+def loadConfig():
+	if configExists():
+		config.read(configPath)
+		
+def clearChallongeConfig():
+	config['challonge']['username'] = ''
+	config['challonge']['apiKey'] = ''
+	saveConfig()
+		
+def saveConfig():
+	if os.path.exists('userdata/') is False:
+		os.makedirs('userdata')
+	with open(configPath, 'w') as configFile:
+		config.write(configFile)
+		
+def setConfigChallonge(name, api):
+	config['challonge'] = {}
+	config['challonge']['username'] = name
+	config['challonge']['apiKey'] = api
+	saveConfig()
+
+def setConfigCSVPath(path):
+	if path[len(path) - 1] != '/':
+		path = path + '/'
+	if 'settings' not in config:
+		config['settings'] = {}
+	config['settings']['csvpath'] = path
+	saveConfig()
+	
+def setDefaultScoring(list):
+	if 'settings' not in config:
+		config['settings'] = {}
+	config['settings']['defaultscoring'] = list
+	saveConfig()
+	
+def setLazyLoad(lazy):
+	if 'settings' not in config:
+		config['settings'] = {}
+	config['settings']['lazyload'] = str(lazy)
+	saveConfig()
+	
+def lazyLoad():
+	if 'settings' in config and 'lazyload' in config['settings']:
+		return config['settings'].getboolean('lazyload')
+	return True
+	
+def participantCacheSize():
+	if 'settings' in config and 'participantcache' in config['settings']:
+		return config['settings'].getint('participantcache')
+	return 256
+	
+def responseCacheSize():	# megabytes
+	if 'settings' in config and 'cachesize' in config['settings']:
+		return config['settings'].getint('cachesize')
+	return 64
+	
+def responseCacheTTL():	# seconds
+	if 'settings' in config and 'cachettl' in config['settings']:
+		return config['settings'].getint('cachettl')
+	return 3600
+	
+def setProfiler(profiler):
+	if 'settings' not in config:
+		config['settings'] = {}
+	config['settings']['profiler'] = profiler
+	saveConfig()
+	
+def profiler():	# off, cprofile or pyinstrument
+	if 'settings' in config and 'profiler' in config['settings']:
+		return config['settings']['profiler']
+	return 'off'
+	
+def apiUrl():	# lets the app talk to a local stub server instead of challonge
+	if 'settings' in config and 'apiurl' in config['settings']:
+		return config['settings']['apiurl']
+	return None
@@ -0,0 +1,134 @@
+import os
+import csv
+import json
+import datetime
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from . import metrics
+
+DEFAULT_CSV_PATH = os.getcwd().replace('\\', '/') + '/csv/'
+
+FORMATS = ['csv', 'jsonl', 'parquet']	# parquet needs pyarrow
+
+CHUNK_SIZE = 1000
+
+def writeAtomically(filename, mode='w', newline=None):	# readers only ever see the old file or the complete new one
+	directory = os.path.dirname(filename) or '.'
+	fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(filename), suffix='.tmp')
+	umask = os.umask(0)
+	os.umask(umask)
+	os.chmod(tmp, 0o666 & ~umask)	# mkstemp makes it owner only, exports are published for others to read
+	return os.fdopen(fd, mode, newline=newline), tmp
+
+def commitFile(f, tmp, filename):
+	f.flush()
+	os.fsync(f.fileno())
+	f.close()
+	os.replace(tmp, filename)
+	
+def exportCSV(path, filename, set):	# should return false on error, not yet implemented. csv file is also incredibly ugly
+	start = time.perf_counter()
+	rankingsList = set.returnRankings()
+	if not os.path.isdir(path):
+		os.makedirs(path)
+	csvfile, tmp = writeAtomically(path + filename, 'w', newline='')
+	try:
+		fieldnames = ['Player', 'Score']
+		writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+		writer.writerow({'Player': set.name, 'Score': '{!s}'.format(datetime.date.isoformat(datetime.date.today()))}) # must be better way of using multiple columns
+		writer.writerow({'Player': '', 'Score': ''})
+		writer.writeheader()
+		for r in rankingsList:
+			writer.writerow({'Player': r[0], 'Score': r[1]})
+		commitFile(csvfile, tmp, path + filename)
+	except BaseException:
+		csvfile.close()
+		os.remove(tmp)
+		raise
+	metrics.observe('export_seconds', time.perf_counter() - start, format='classic csv')
+	return True
+	
+def iterRankings(set):	# (position, player, points) read from the rank index a chunk at a time
+	start = 0
+	while True:
+		chunk = set.returnRankings(start, start + CHUNK_SIZE)
+		for i, (player, points) in enumerate(chunk):
+			yield start + i + 1, player, points
+		if len(chunk) < CHUNK_SIZE:
+			return
+		start += CHUNK_SIZE
+	
+def writeLeaderboard(name, rows, path, formats, date):	# writes every format in a single pass over rows, returns the files written
+	if 'parquet' in formats:
+		try:
+			import pyarrow
+			import pyarrow.parquet
+		except ImportError:
+			raise ImportError('Parquet export requires pyarrow (pip install pyarrow)')
+	if not os.path.isdir(path):
+		os.makedirs(path)
+	opened = []
+	try:
+		writers = []
+		if 'csv' in formats:
+			f, tmp = writeAtomically(path + name + '.csv', 'w', newline='')
+			opened.append((f, tmp, path + name + '.csv'))
+			writer = csv.writer(f)
+			writer.writerow(['Rank', 'Player', 'Points'])
+			writers.append(lambda row, writer=writer: writer.writerow(row))
+		if 'jsonl' in formats:
+			f, tmp = writeAtomically(path + name + '.jsonl', 'w')
+			opened.append((f, tmp, path + name + '.jsonl'))
+			writers.append(lambda row, f=f: f.write(json.dumps({'set': name, 'date': date, 'rank': row[0], 'player': row[1], 'points': row[2]}) + '\n'))
+		columns = ([], [], [])
+		if 'parquet' in formats:
+			def collect(row):
+				for column, value in zip(columns, row):
+					column.append(value)
+			writers.append(collect)
+		for row in rows:
+			for write in writers:
+				write(row)
+		if 'parquet' in formats:
+			f, tmp = writeAtomically(path + name + '.parquet', 'wb')
+			opened.append((f, tmp, path + name + '.parquet'))
+			table = pyarrow.table({'rank': columns[0], 'player': columns[1], 'points': columns[2]})
+			table = table.replace_schema_metadata({'set': name, 'date': date})
+			pyarrow.parquet.write_table(table, f)
+		for f, tmp, filename in opened:
+			commitFile(f, tmp, filename)
+	except BaseException:
+		for f, tmp, filename in opened:
+			if not f.closed:
+				f.close()
+			if os.path.isfile(tmp):
+				os.remove(tmp)
+		raise
+	return [filename for f, tmp, filename in opened]
+	
+def exportSets(sets, path, formats=('csv', 'jsonl'), processes=None):	# returns {set name: files written or the exception raised}
+	for format in formats:
+		if format not in FORMATS:
+			raise ValueError('Unknown export format {}'.format(format))
+	start = time.perf_counter()
+	date = datetime.date.isoformat(datetime.date.today())
+	results = {}
+	if processes is None or processes <= 1 or len(sets) <= 1:
+		for set in sets:
+			try:
+				results[set.name] = writeLeaderboard(set.name, iterRankings(set), path, formats, date)
+			except Exception as e:
+				results[set.name] = e
+	else:
+		with ProcessPoolExecutor(max_workers=processes) as executor:	# rankings come from this process, the pool only formats and writes
+			futures = {}
+			for set in sets:
+				futures[set.name] = executor.submit(writeLeaderboard, set.name, list(iterRankings(set)), path, formats, date)
+			for name, future in futures.items():
+				try:
+					results[name] = future.result()
+				except Exception as e:
+					results[name] = e
+	metrics.observe('export_seconds', time.perf_counter() - start, format=','.join(formats))
+	return results
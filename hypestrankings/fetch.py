@@ -0,0 +1,131 @@
+import threading
+import datetime
+from . import cache
+from . import metrics
+
+client = None
+clientLock = threading.Lock()
+credentials = None
+baseUrl = None
+
+def api():	# the http client is only set up the first time something is fetched
+	global client
+	with clientLock:	# fetches start on several threads at once
+		if client is None:
+			from .client import ChallongeClient, DEFAULT_BASE_URL
+			client = ChallongeClient(baseUrl or DEFAULT_BASE_URL)
+			client.timingListeners.append(recordRequest)
+			if credentials is not None:
+				client.setCredentials(*credentials)
+	return client
+
+def recordRequest(endpoint, status, seconds, attempt):
+	metrics.observe('fetch_seconds', seconds, endpoint=endpoint)
+	metrics.count('fetch_requests_total', endpoint=endpoint, status=status or 'error')
+	if attempt > 0:
+		metrics.count('fetch_retries_total', endpoint=endpoint)
+
+def setCredentials(username, apiKey):
+	global credentials
+	with clientLock:
+		credentials = (username, apiKey)
+		if client is not None:
+			client.setCredentials(username, apiKey)
+			
+def setBaseUrl(url):	# e.g. a local stub server
+	global client, baseUrl
+	with clientLock:
+		baseUrl = url
+		if client is not None:
+			client.close()
+			client = None
+
+def timestamp(value):	# challonge returns datetimes or iso strings, they're stored as iso strings
+	if value is None or isinstance(value, str):
+		return value
+	return value.isoformat()
+	
+def parseTime(value):	# naive utc datetime of a stored timestamp, None if there isn't a usable one
+	if value is None:
+		return None
+	try:
+		parsed = datetime.datetime.fromisoformat(timestamp(value))
+	except ValueError:
+		return None
+	if parsed.tzinfo is not None:
+		parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+	return parsed
+	
+def showTournament(url, cached=None):	# revalidates a cached response with its etag
+	etag = None
+	if cached is not None:
+		etag = cached['etag']
+	t, etag = api().tournament(url, etag)
+	if t is None:
+		t = cached['data']
+	cache.put('tournaments.show', url, t, immutable=t['state'] == 'complete', etag=etag)
+	return t
+	
+def listParticipants(t, cached=None):
+	etag = None
+	if cached is not None:
+		etag = cached['etag']
+	p, etag = api().participants(t['id'], etag)
+	if p is None:
+		p = cached['data']
+	cache.put('participants.index', t['id'], p, immutable=t['state'] == 'complete', validator=timestamp(t['updated-at']), etag=etag)
+	return p
+
+def listMatches(t, cached=None):
+	etag = None
+	if cached is not None:
+		etag = cached['etag']
+	m, etag = api().matches(t['id'], etag)
+	if m is None:
+		m = cached['data']
+	cache.put('matches.index', t['id'], m, immutable=t['state'] == 'complete', validator=timestamp(t['updated-at']), etag=etag)
+	return m
+
+def fetchTournament(url):	# responses are cached on disk, participants are only fetched again if the tournament was updated
+	shown = cache.get('tournaments.show', url)
+	if shown is not None and cache.isFresh(shown):
+		t = shown['data']
+	else:
+		t = showTournament(url, shown)
+	listed = cache.get('participants.index', t['id'])
+	if listed is not None and (listed['immutable'] or listed['validator'] == timestamp(t['updated-at'])):
+		p = listed['data']
+	else:
+		p = listParticipants(t, listed)
+	return t, p
+	
+def fetchMatches(url):	# (tournament, participants, matches), cached the same way as participants
+	t, p = fetchTournament(url)
+	listed = cache.get('matches.index', t['id'])
+	if listed is not None and (listed['immutable'] or listed['validator'] == timestamp(t['updated-at'])):
+		m = listed['data']
+	else:
+		m = listMatches(t, listed)
+	return t, p, m
+	
+def fetchTournamentIfChanged(url, updatedAt):	# always asks challonge, returns None if the tournament hasn't been updated since updatedAt
+	t = showTournament(url, cache.get('tournaments.show', url))
+	if updatedAt is not None and timestamp(t['updated-at']) == updatedAt:
+		return None
+	return t, listParticipants(t, cache.get('participants.index', t['id']))
+
+def httpErrorMessage(err):
+	if err.code == 400:
+		return 'HTTP Error 400: Bad request. Check URL.'
+	elif err.code == 401:
+		return 'HTTP Error 401: Challonge details incorrect or insufficient permissions.'
+	elif err.code == 404:
+		return 'HTTP Error 404: Object not found within your challonge account scope. Check URL.'
+	elif err.code == 406:
+		return 'HTTP Error 406: Requested format not supported - something has gone horribly wrong.'
+	elif err.code == 422:
+		return 'HTTP Error 422: Challonge validation error.'
+	elif err.code == 500:
+		return 'HTTP Error 500: Challonge service error.'
+	else:
+		return 'Unforeseen error: {}'.format(str(err))
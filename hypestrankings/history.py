@@ -0,0 +1,46 @@
+import json
+import datetime
+from . import storage
+
+# Every save that changed a set's leaderboard stores a snapshot of the players whose points changed, null for players who left it.
+# Every CHECKPOINT_INTERVAL snapshots, or when most of the leaderboard changed, the whole leaderboard is stored instead,
+# so the leaderboard at any time is rebuilt from one checkpoint and the deltas after it.
+
+CHECKPOINT_INTERVAL = 32
+
+def timeText(at):	# stored form of a time, naive datetimes are utc
+	if at.tzinfo is not None:
+		at = at.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+	return at.isoformat(timespec='microseconds')
+
+def now():
+	return timeText(datetime.datetime.now(datetime.timezone.utc))
+
+def record(setName, position, checkpoint, changes):
+	storage.snapshotTaken(setName, position, now(), checkpoint, json.dumps(changes, separators=(',', ':')))
+
+def points(setName, at=None):	# {player: points} of the set as of at, the latest snapshot if None, empty if there was none yet
+	leaderboard = {}
+	for checkpoint, changes in storage.loadSnapshots(setName, None if at is None else timeText(at)):
+		if checkpoint:
+			leaderboard = {}
+		for player, p in json.loads(changes).items():
+			if p is None:
+				leaderboard.pop(player, None)
+			else:
+				leaderboard[player] = p
+	return leaderboard
+
+def ranked(leaderboard):	# [(player, points)] in the order of Set.returnRankings
+	return sorted(leaderboard.items(), key=lambda x: (-x[1], x[0]))
+
+def movement(before, after):	# [(player, old rank, new rank, old points, new points)] of players who moved, None when off the leaderboard
+	old = {player: (i + 1, p) for i, (player, p) in enumerate(before)}
+	moved = []
+	for i, (player, p) in enumerate(after):
+		rank, was = old.pop(player, (None, None))
+		if rank != i + 1:
+			moved.append((player, rank, i + 1, was, p))
+	for player, (rank, was) in sorted(old.items(), key=lambda x: x[1][0]):
+		moved.append((player, rank, None, was, None))
+	return moved
@@ -0,0 +1,129 @@
+import math
+import threading
+import unicodedata
+from collections import defaultdict, Counter
+
+USERNAME = 'username'
+NAME = 'name'
+PARTICIPANT = 'participant'	# challonge participant id, stable across refreshes of the same tournament
+
+def normalize(alias):	# aliases match regardless of case, width and repeated whitespace
+	return ' '.join(unicodedata.normalize('NFKC', str(alias)).casefold().split())
+
+class AliasIndex:	# hash index of (kind, normalized alias): canonical player name
+	def __init__(self):
+		self.aliases = {}
+		self.lock = threading.Lock()
+		
+	def load(self, rows):
+		with self.lock:
+			self.aliases = {(kind, normalize(alias)): player for kind, alias, player in rows}
+			
+	def clear(self):
+		with self.lock:
+			self.aliases.clear()
+			
+	def lookup(self, kind, alias):
+		return self.aliases.get((kind, normalize(alias)))
+		
+	def add(self, kind, alias, player):	# returns True if the alias is new or now points somewhere else
+		key = (kind, normalize(alias))
+		with self.lock:
+			if self.aliases.get(key) == player:
+				return False
+			self.aliases[key] = player
+			return True
+			
+	def retarget(self, old, new):	# aliases of a merged player follow it to the new one
+		with self.lock:
+			for key, player in self.aliases.items():
+				if player == old:
+					self.aliases[key] = new
+					
+	def resolve(self, participant):	# canonical player of a challonge participant, None if it has nothing to identify it by
+		username = participant.get('challonge-username')
+		name = participant.get('name') or participant.get('display-name')
+		if username is not None:	# accounts are only identified by their username, display names aren't unique
+			candidates = [(PARTICIPANT, participant.get('id')), (USERNAME, username)]
+		else:
+			candidates = [(PARTICIPANT, participant.get('id')), (NAME, name), (USERNAME, name)]	# a guest entering under their username is the same player
+		for kind, alias in candidates:
+			if alias is not None:
+				player = self.lookup(kind, alias)
+				if player is not None:
+					return player
+		return username or name or None
+		
+	def learn(self, participant, player):	# remembers how a resolved participant was identified, returns the new (kind, alias, player) rows
+		learned = []
+		username = participant.get('challonge-username')
+		if username is not None:
+			aliases = [(PARTICIPANT, participant.get('id')), (USERNAME, username)]
+		else:	# later guest entries match the name whatever its case
+			aliases = [(PARTICIPANT, participant.get('id')), (NAME, participant.get('name') or participant.get('display-name'))]
+		for kind, alias in aliases:
+			if alias is not None and self.lookup(kind, alias) is None and self.add(kind, alias, player):
+				learned.append((kind, str(alias), player))
+		return learned
+		
+class NgramIndex:	# n-gram postings of player names for fuzzy merge suggestions
+	def __init__(self, names=(), n=3):
+		self.n = n
+		self.postings = defaultdict(set)
+		self.grams = {}
+		for name in names:
+			self.add(name)
+			
+	def ngrams(self, name):
+		padded = ' ' + normalize(name) + ' '
+		return {padded[i:i + self.n] for i in range(max(1, len(padded) - self.n + 1))}
+		
+	def add(self, name):
+		if name in self.grams:
+			return
+		grams = self.ngrams(name)
+		self.grams[name] = grams
+		for gram in grams:
+			self.postings[gram].add(name)
+			
+	def remove(self, name):
+		for gram in self.grams.pop(name, ()):
+			self.postings[gram].discard(name)
+			
+	def similar(self, name, threshold=0.6, limit=10):	# [(other name, dice coefficient)] best first, only names sharing an n-gram are scored
+		grams = self.ngrams(name)
+		shared = Counter()
+		for gram in grams:
+			shared.update(self.postings.get(gram, ()))
+		shared.pop(name, None)
+		matches = []
+		for other, count in shared.items():
+			score = 2 * count / (len(grams) + len(self.grams[other]))
+			if score >= threshold:
+				matches.append((other, score))
+		matches.sort(key=lambda x: (-x[1], x[0]))
+		return matches[:limit]
+		
+	def suggestions(self, threshold=0.6, limit=100):	# [(name, other name, score)] of likely duplicate players, best first
+		prefixes = defaultdict(list)	# gram: names with it among the rarest grams they can't score threshold without sharing
+		pairs = []
+		for name, grams in sorted(self.grams.items(), key=lambda x: len(x[1])):
+			needed = math.ceil(threshold * len(grams) / (2 - threshold) - 1e-9)
+			rarest = sorted(grams, key=lambda gram: (len(self.postings[gram]), gram))[:len(grams) - needed + 1]	# grams like "pla" in every "player" come last
+			candidates = set()
+			for gram in rarest:
+				candidates.update(prefixes[gram])
+				prefixes[gram].append(name)
+			for other in candidates:
+				otherGrams = self.grams[other]
+				if 2 * len(otherGrams) < threshold * (len(grams) + len(otherGrams)):	# too short to reach threshold
+					continue
+				score = 2 * len(grams & otherGrams) / (len(grams) + len(otherGrams))
+				if score >= threshold:
+					pairs.append((min(name, other), max(name, other), score))
+			if len(pairs) > 4 * limit:	# only the best limit are returned, pairs scoring below them no longer count
+				pairs.sort(key=lambda x: (-x[2], x[0], x[1]))
+				del pairs[limit:]
+				threshold = pairs[-1][2]
+		pairs.sort(key=lambda x: (-x[2], x[0], x[1]))
+		return pairs[:limit]
@@ -0,0 +1,115 @@
+import os
+import time
+import json
+import threading
+from contextlib import contextmanager
+from . import config
+
+# In-process counters and timings of the slow paths: challonge requests, database saves, ranking and widget fills.
+# Dumped as json or prometheus text by the cli and shown in the gui's diagnostics window.
+
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)	# seconds, upper bounds of the histogram buckets
+PROFILE_PATH = 'userdata/profiles/'
+
+lock = threading.Lock()
+counters = {}	# (name, labels): value
+timings = {}	# (name, labels): [count, total seconds, max seconds, bucket counts]
+
+def labelKey(labels):
+	return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def count(name, value=1, **labels):
+	key = (name, labelKey(labels))
+	with lock:
+		counters[key] = counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+	key = (name, labelKey(labels))
+	with lock:
+		timing = timings.get(key)
+		if timing is None:
+			timing = timings[key] = [0, 0.0, 0.0, [0] * len(BUCKETS)]
+		timing[0] += 1
+		timing[1] += seconds
+		timing[2] = max(timing[2], seconds)
+		for i, bound in enumerate(BUCKETS):
+			if seconds <= bound:
+				timing[3][i] += 1
+
+@contextmanager
+def timer(name, **labels):
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		observe(name, time.perf_counter() - start, **labels)
+
+def reset():
+	with lock:
+		counters.clear()
+		timings.clear()
+
+def snapshot():	# {'counters': [...], 'timings': [...]} sorted by name
+	with lock:
+		return {
+			'counters': [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in sorted(counters.items())],
+			'timings': [{'name': name, 'labels': dict(labels), 'count': t[0], 'total': t[1], 'max': t[2]}
+				for (name, labels), t in sorted(timings.items())]}
+
+def toJSON():
+	return json.dumps(snapshot(), indent=1)
+
+def prometheusLabels(labels, extra=()):
+	labels = list(labels) + list(extra)
+	if len(labels) == 0:
+		return ''
+	return '{' + ','.join('{}="{}"'.format(key, value.replace('\\', '\\\\').replace('"', '\\"')) for key, value in labels) + '}'
+
+def toPrometheus():	# text exposition format, timings are histograms in seconds
+	lines = []
+	with lock:
+		names = []
+		for (name, labels), value in sorted(counters.items()):
+			if name not in names:
+				names.append(name)
+				lines.append('# TYPE hypestrankings_{} counter'.format(name))
+			lines.append('hypestrankings_{}{} {}'.format(name, prometheusLabels(labels), value))
+		for (name, labels), (n, total, longest, buckets) in sorted(timings.items()):
+			if name not in names:
+				names.append(name)
+				lines.append('# TYPE hypestrankings_{} histogram'.format(name))
+			for bound, bucket in zip(BUCKETS, buckets):
+				lines.append('hypestrankings_{}_bucket{} {}'.format(name, prometheusLabels(labels, [('le', str(bound))]), bucket))
+			lines.append('hypestrankings_{}_bucket{} {}'.format(name, prometheusLabels(labels, [('le', '+Inf')]), n))
+			lines.append('hypestrankings_{}_sum{} {}'.format(name, prometheusLabels(labels), total))
+			lines.append('hypestrankings_{}_count{} {}'.format(name, prometheusLabels(labels), n))
+	return '\n'.join(lines) + '\n'
+
+@contextmanager
+def profile(name):	# profiles the block with the profiler picked in the settings, only the calling thread is profiled
+	profiler = config.profiler()
+	if profiler == 'cprofile':
+		import cProfile
+		p = cProfile.Profile()
+		p.enable()
+	elif profiler == 'pyinstrument':
+		try:
+			from pyinstrument import Profiler
+		except ImportError:
+			raise ImportError('pyinstrument profiling requires pyinstrument (pip install pyinstrument)')
+		p = Profiler()
+		p.start()
+	try:
+		yield
+	finally:
+		if profiler in ('cprofile', 'pyinstrument'):
+			if not os.path.isdir(PROFILE_PATH):
+				os.makedirs(PROFILE_PATH)
+			filename = PROFILE_PATH + '{}-{}'.format(name.replace('/', '_'), time.strftime('%Y%m%d-%H%M%S'))
+			if profiler == 'cprofile':
+				p.disable()
+				p.dump_stats(filename + '.prof')
+			else:
+				p.stop()
+				with open(filename + '.html', 'w') as f:
+					f.write(p.output_html())
@@ -0,0 +1,985 @@
+import os
+import sys
+import time
+import datetime
+import functools
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError, as_completed
+from bisect import bisect_left, insort
+from . import config
+from . import storage
+from . import cache
+from . import fetch
+from . import identity
+from . import metrics
+from . import history
+from .tiers import ScoringRule, parseScoring
+from .fetch import fetchTournament, fetchTournamentIfChanged, timestamp, parseTime
+
+DEFAULT_SCORING = [15, 12, 10, 8, 5, 5, 3, 3]
+
+BULK_IMPORT_WORKERS = 8
+
+setDict = {}
+tournamentDict = {}
+
+lock = threading.RLock()	# held by every change to sets and tournaments and every read that builds rankings or indexes, gui workers read while the gui thread changes them
+
+def locked(function):
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		with lock:
+			return function(*args, **kwargs)
+	return wrapper
+
+participantCache = OrderedDict()	# url: (player ids, ranks) of lazily loaded tournaments, least recently used first
+participantCacheSize = 256
+participantCacheLock = threading.Lock()
+
+guestMerges = []	# (guest player, account) found while parsing, merged once the tournament is saved
+
+changedSets = {}	# sets whose leaderboard changed since their last snapshot, taken when saved or once the leaderboard is next computed
+
+dataVersion = 0	# raised by touch() on every change to a set or tournament
+versionLock = threading.Lock()
+
+class PlayerRegistry:	# every player name is interned once and referred to by an integer id everywhere else
+	__slots__ = ('names', 'ids', 'lock')
+	
+	def __init__(self):
+		self.names = []
+		self.ids = {}
+		self.lock = threading.Lock()	# lazily loaded tournaments can register players from worker threads
+		
+	def id(self, name):
+		id = self.ids.get(name)
+		if id is None:
+			with self.lock:
+				if name not in self.ids:
+					name = sys.intern(name)
+					self.ids[name] = len(self.names)
+					self.names.append(name)
+				id = self.ids[name]
+		return id
+		
+	def name(self, id):
+		return self.names[id]
+		
+playerRegistry = PlayerRegistry()
+
+class PlayerIndex:	# inverted index of player id: {url: rank} over every tournament, built the first time it's queried
+	__slots__ = ('placements', 'names', 'valid')
+	
+	def __init__(self):
+		self.placements = {}
+		self.names = []	# sorted (normalized name, name) of indexed players for prefix search
+		self.valid = False
+		
+	def clear(self):
+		self.placements = {}
+		self.names = []
+		self.valid = False
+		
+	@locked
+	def build(self):
+		self.clear()
+		participants = storage.loadTournaments()
+		for url, t in tournamentDict.items():
+			if t.playerIds is not None:
+				self.add(url, t.columns())
+			else:
+				for player, rank in participants.get(url, {}).items():
+					self.addPlacement(url, playerRegistry.id(player), rank)
+		self.names.sort()
+		self.valid = True
+		
+	def add(self, url, columns):
+		for id, rank in zip(*columns):
+			self.addPlacement(url, id, rank)
+			
+	def addPlacement(self, url, id, rank):
+		if id not in self.placements:
+			self.placements[id] = {}
+			key = (identity.normalize(playerRegistry.names[id]), playerRegistry.names[id])
+			if self.valid:
+				insort(self.names, key)
+			else:
+				self.names.append(key)
+		self.placements[id][url] = rank
+		
+	def remove(self, url, columns):
+		for id in columns[0]:
+			placements = self.placements.get(id)
+			if placements is None:
+				continue
+			placements.pop(url, None)
+			if len(placements) == 0:
+				del self.placements[id]
+				name = playerRegistry.names[id]
+				i = bisect_left(self.names, (identity.normalize(name), name))
+				if i < len(self.names) and self.names[i][1] == name:
+					del self.names[i]
+					
+	@locked
+	def get(self, name):	# {url: rank}
+		if not self.valid:
+			self.build()
+		id = playerRegistry.ids.get(name)
+		return dict(self.placements.get(id, {}))	# a copy, callers read it without the lock
+		
+	@locked
+	def search(self, prefix, limit=20):	# indexed names starting with prefix, ignoring case
+		if not self.valid:
+			self.build()
+		prefix = identity.normalize(prefix)
+		i = bisect_left(self.names, (prefix,))
+		found = []
+		while i < len(self.names) and len(found) < limit and self.names[i][0].startswith(prefix):
+			found.append(self.names[i][1])
+			i += 1
+		return found
+		
+playerIndex = PlayerIndex()
+
+aliasIndex = identity.AliasIndex()
+playerNgrams = None	# identity.NgramIndex of every player, built the first time suggestions are asked for
+
+def touch(*objects):	# gives the changed sets or tournaments, and the data as a whole, a new version. server.py caches responses per version
+	global dataVersion
+	with versionLock:
+		dataVersion += 1
+		for o in objects:
+			o.version = dataVersion
+
+@locked
+def saveData():
+	for s in list(changedSets):
+		if s.rankingsValid:	# the others wait for their leaderboard to be computed, which saving shouldn't force on the gui thread
+			s.snapshot()
+	storage.commit()
+	while len(guestMerges) > 0:	# after the commit, so the guest's tournaments of this save are found too
+		guest, player = guestMerges.pop(0)
+		mergePlayers(guest, player)
+	
+@locked
+def saveSnapshots():	# computes the leaderboards still waiting for a snapshot, for commands about to exit
+	for s in list(changedSets):
+		s.returnRankings()
+	saveData()
+
+@locked
+def loadData():
+	global participantCacheSize, playerNgrams
+	start = time.perf_counter()
+	if len(changedSets) > 0:	# the sets about to be replaced still owe a snapshot of their last change
+		saveSnapshots()
+	if storage.isEmpty() and os.path.isfile(storage.legacySetsPath):
+		storage.migratePickles()
+	setDict.clear()
+	tournamentDict.clear()
+	changedSets.clear()
+	for name, scoring in storage.loadSets():
+		setDict[name] = Set(name, scoring)
+	participantCache.clear()
+	playerIndex.clear()
+	aliasIndex.load(storage.loadAliases())
+	playerNgrams = None
+	tags = storage.loadTournamentTags()
+	if config.lazyLoad():	# participants are read from the database when first needed
+		participantCacheSize = config.participantCacheSize()
+		for url, state, updatedAt, startedAt, completedAt in storage.loadTournamentIndex():
+			Tournament(url, lazy=True, state=state, updatedAt=updatedAt, startedAt=startedAt, completedAt=completedAt, tags=tags.get(url, ()))
+	else:
+		participants = storage.loadTournaments()
+		for url, state, updatedAt, startedAt, completedAt in storage.loadTournamentIndex():
+			Tournament(url, participants=participants[url], state=state, updatedAt=updatedAt, startedAt=startedAt, completedAt=completedAt,
+				tags=tags.get(url, ()))
+	for name, url in storage.loadSetTournaments():
+		setDict[name].tournaments[url] = tournamentDict[url]
+		tournamentDict[url].sets.append(setDict[name])
+	touch()
+	metrics.observe('load_seconds', time.perf_counter() - start, lazy=config.lazyLoad())
+	
+@locked
+def deleteData():
+	global playerNgrams
+	storage.deleteDatabase()
+	cache.clear()
+	participantCache.clear()
+	aliasIndex.clear()
+	playerIndex.clear()
+	playerNgrams = None
+	setDict.clear()
+	tournamentDict.clear()
+	changedSets.clear()
+	touch()
+	
+@locked
+def newSet(name):
+	set = Set(name)
+	setDict[name] = set
+	storage.setChanged(set)
+	saveData()
+	return set
+		
+class RankIndex:	# kept sorted by (score, name) so reads never re-sort, ties are broken by name
+	def __init__(self, scores={}, descending=False):
+		self.descending = descending
+		self.scores = dict(scores)
+		self.keys = sorted(self.key(name, score) for name, score in self.scores.items())
+		
+	def key(self, name, score):
+		if self.descending:
+			return (-score, name)
+		return (score, name)
+		
+	def update(self, name, score):
+		if name in self.scores:
+			if self.scores[name] == score:
+				return
+			self.remove(name)
+		self.scores[name] = score
+		insort(self.keys, self.key(name, score))
+		
+	def remove(self, name):
+		score = self.scores.pop(name)
+		del self.keys[bisect_left(self.keys, self.key(name, score))]
+		
+	def rank(self, name):	# position in the index starting at 1, None if the name isn't indexed
+		if name not in self.scores:
+			return None
+		return bisect_left(self.keys, self.key(name, self.scores[name])) + 1
+		
+	def slice(self, start=0, stop=None):
+		return [(name, self.scores[name]) for score, name in self.keys[start:stop]]
+		
+	def top(self, n):
+		return self.slice(0, n)
+		
+	def page(self, page, pageSize):
+		return self.slice(page * pageSize, (page + 1) * pageSize)
+		
+	def __len__(self):
+		return len(self.keys)
+				
+class Set:	## add sets with newSet(s)
+	__slots__ = ('name', 'tournaments', 'rankings', 'placements', 'rankIndex', 'rankingsValid', 'scoring', 'rule', 'windows', 'version', 'moved', 'snapshots')
+	
+	def __init__(self, name, scoring=None):
+		self.name = name
+		self.tournaments = {}
+		self.rankings = {}	# player id: points
+		self.placements = {}	# player id: {rank: times placed}, lets rankings be updated one tournament at a time
+		self.rankIndex = RankIndex(descending=True)
+		self.rankingsValid = False	# rankings are only built once they're first read
+		self.windows = {}	# (days, half life): RankingWindow, kept so moving a window only touches the events at its edges
+		self.moved = None	# ids of players whose points changed since the last snapshot, None if unknown
+		self.snapshots = None	# [position of the latest snapshot, position of the latest checkpoint], read when first needed
+		if scoring is not None:
+			self.scoring = scoring
+		elif 'settings' in config.config and 'scoring' in config.config['settings']:	# ability to set default scoring not yet implemented
+			self.scoring = parseScoring(config.config['settings']['scoring'])
+		else:
+			self.scoring = DEFAULT_SCORING
+		self.rule = ScoringRule(self.scoring)	# flat list or tiers, see tiers.py
+		touch(self)
+		
+	@locked
+	def addTournament(self, url):
+		if url in self.tournaments:
+			raise ValueError('Tournament already exists.')
+		elif url in tournamentDict:
+			self.linkTournament(tournamentDict[url])
+		else:
+			self.linkTournament(Tournament(url))
+		saveData()
+		return True
+
+	def addTournaments(self, urls, progress=None, workers=BULK_IMPORT_WORKERS):	# returns dict of url: exception for every url that failed
+		fetched, errors = fetchTournaments([url for url in urls if url not in self.tournaments], progress, workers)
+		return self.addFetchedTournaments(urls, fetched, errors)
+		
+	@locked
+	def addFetchedTournaments(self, urls, fetched, errors={}):	# second half of addTournaments, for when fetchTournaments ran on another thread
+		errors = dict(errors)
+		for url in dict.fromkeys(urls):
+			if url in errors:
+				continue
+			elif url in self.tournaments:
+				errors[url] = ValueError('Tournament already exists.')
+			elif url in tournamentDict:
+				self.linkTournament(tournamentDict[url])
+			elif url in fetched:
+				self.linkTournament(Tournament(url, fetched[url]))
+		saveData()
+		return errors
+		
+	def linkTournament(self, t):
+		self.tournaments[t.url] = t
+		t.sets.append(self)
+		storage.setTournamentAdded(self.name, t.url)
+		self.applyTournament(t.columns(), 1, t.url)
+		
+	@locked
+	def removeTournament(self, url):
+		if url not in self.tournaments:
+			return False
+		else:
+			self.applyTournament(self.tournaments[url].columns(), -1, url)
+			self.tournaments[url].sets.remove(self)
+			storage.setTournamentRemoved(self.name, url)
+			if len(self.tournaments[url].sets) == 0:
+				forgetTournament(url)
+			del self.tournaments[url]
+		saveData()
+			
+	@locked
+	def removeSet(self):
+		for key, t in self.tournaments.items():
+			t.sets.remove(self)
+			if len(t.sets) == 0:
+				forgetTournament(t.url)
+		del setDict[self.name]
+		changedSets.pop(self, None)
+		touch(self)
+		storage.setRemoved(self.name)
+		saveData()
+		
+	@locked
+	def rename(self, name):
+		if name in setDict:
+			raise ValueError('Set with name already exists')
+		del setDict[self.name]
+		storage.setRenamed(self.name, name)
+		self.name = name
+		setDict[name] = self
+		touch(self)
+		saveData()
+		
+	@locked
+	def setScoring(self, scoring):
+		self.rule = ScoringRule(scoring)
+		self.scoring = scoring
+		self.windows.clear()
+		self.moved = None
+		changedSets[self] = True
+		touch(self)
+		if self.rankingsValid and self.rule.flat:	# placement counts are enough to rescore without reading any tournament
+			for id, placements in self.placements.items():
+				self.rankings[id] = self.pointsFor(placements)
+			self.buildRankIndex()
+		else:
+			self.rankingsValid = False
+		storage.setChanged(self)
+		saveData()
+		
+	def pointsFor(self, placements):	# only for flat scorings, which may still be written as {"points": [...]}
+		points = 0
+		table = self.rule.default
+		for rank, count in placements.items():
+			if rank <= len(table):
+				points += table[rank - 1] * count
+		return points
+		
+	def buildRankIndex(self):
+		names = playerRegistry.names
+		self.rankIndex = RankIndex({names[id]: points for id, points in self.rankings.items()}, descending=True)
+		
+	def applyTournament(self, columns, sign, url):	# columns are a tournament's (player ids, ranks), sign is 1 when it's added and -1 when it's removed
+		touch(self)
+		changedSets[self] = True
+		for window in self.windows.values():
+			window.applyTournament(url, columns, sign)
+		if not self.rankingsValid:
+			self.moved = None
+			return
+		if self.moved is not None:
+			self.moved.update(columns[0])
+		start = time.perf_counter()
+		names = playerRegistry.names
+		points = tournamentDict[url].pointsFor(self.rule, columns)
+		for id, rank, p in zip(columns[0], columns[1], points):
+			placements = self.placements.setdefault(id, {})
+			placements[rank] = placements.get(rank, 0) + sign
+			if placements[rank] == 0:
+				del placements[rank]
+			if len(placements) == 0:
+				del self.placements[id]
+				del self.rankings[id]
+				self.rankIndex.remove(names[id])
+			else:
+				self.rankings[id] = self.rankings.get(id, 0) + p * sign
+				self.rankIndex.update(names[id], self.rankings[id])
+		metrics.observe('ranking_seconds', time.perf_counter() - start, mode='incremental')
+		
+	@locked
+	def calculateRankings(self):	# full recompute, the incremental updates above must always agree with this
+		start = time.perf_counter()
+		self.rankings = {}
+		self.placements = {}
+		for key, t in self.tournaments.items():
+			columns = t.columns()
+			for id, rank, p in zip(columns[0], columns[1], t.pointsFor(self.rule, columns)):
+				if id not in self.rankings:
+					self.rankings[id] = 0
+					self.placements[id] = {}
+				self.placements[id][rank] = self.placements[id].get(rank, 0) + 1
+				self.rankings[id] += p
+		self.buildRankIndex()
+		self.rankingsValid = True
+		metrics.observe('ranking_seconds', time.perf_counter() - start, mode='full')
+		if self in changedSets:	# queued, written with the next save
+			self.snapshot()
+
+	def snapshot(self):	# stores the points that changed since the last snapshot, or the whole leaderboard as a checkpoint, see history.py
+		changedSets.pop(self, None)
+		if self.snapshots is None:
+			self.snapshots = list(storage.lastSnapshot(self.name))
+		names = playerRegistry.names
+		if self.moved is None or self.snapshots[1] == 0:	# compared with the stored leaderboard
+			storage.commit()	# including a snapshot of the set that may still be queued
+			previous = history.points(self.name)
+			changes = {}
+			for id, points in self.rankings.items():
+				if previous.pop(names[id], None) != points:
+					changes[names[id]] = points
+			for name in previous:
+				changes[name] = None
+		else:
+			changes = {names[id]: self.rankings.get(id) for id in self.moved}
+		self.moved = set()
+		if len(changes) == 0:
+			return
+		position = self.snapshots[0] + 1
+		if self.snapshots[1] == 0 or position - self.snapshots[1] >= history.CHECKPOINT_INTERVAL or 2 * len(changes) >= len(self.rankings):
+			history.record(self.name, position, True, {names[id]: points for id, points in self.rankings.items()})
+			self.snapshots = [position, position]
+		else:
+			history.record(self.name, position, False, changes)
+			self.snapshots[0] = position
+			
+	def rankingsAt(self, at=None, start=0, stop=None):	# leaderboard as last saved at or before at (utc), [] before the first snapshot
+		return history.ranked(history.points(self.name, at))[start:stop]
+		
+	def movementSince(self, since):	# [(player, old rank, new rank, old points, new points)] of players who moved since the leaderboard saved at since
+		return history.movement(self.rankingsAt(since), self.returnRankings())
+		
+	@locked
+	def returnRankings(self, start=0, stop=None):
+		if not self.rankingsValid:
+			self.calculateRankings()
+		return self.rankIndex.slice(start, stop)
+		
+	@locked
+	def windowedRankings(self, days, end=None, start=0, stop=None):	# points from tournaments played in the days up to end (default now)
+		return self.window(days, None).moveTo(end).slice(start, stop)
+		
+	@locked
+	def decayedRankings(self, halfLife, end=None, days=None, start=0, stop=None):	# points halve every halfLife days before end, optionally only within days
+		return self.window(days, halfLife).moveTo(end).slice(start, stop)
+		
+	def window(self, days, halfLife):
+		key = (days, halfLife)
+		if key not in self.windows:
+			self.windows[key] = RankingWindow(self, days, halfLife)
+		return self.windows[key]
+		
+	@locked
+	def playerRank(self, name):
+		if not self.rankingsValid:
+			self.calculateRankings()
+		return self.rankIndex.rank(name)
+		
+	@locked
+	def playerStats(self, name):	# (points, events attended, best placing) or None if the player isn't in the set
+		if not self.rankingsValid:
+			self.calculateRankings()
+		id = playerRegistry.ids.get(name)
+		if id not in self.placements:
+			return None
+		return self.rankings[id], sum(self.placements[id].values()), min(self.placements[id])
+		
+class RankingWindow:	# sliding aggregate over a set's dated tournaments, moving it only adds or removes the tournaments crossing its edges
+	def __init__(self, set, days=None, halfLife=None):
+		self.set = set
+		self.days = days
+		self.halfLife = halfLife
+		self.played = {url: t.playedAt() for url, t in set.tournaments.items() if t.playedAt() is not None}	# undated tournaments can't be placed in a window
+		self.events = sorted((played, url) for url, played in self.played.items())
+		self.start = 0	# the window holds events[start:stop]
+		self.stop = 0
+		self.end = None
+		self.reference = self.events[0][0] if len(self.events) > 0 else None	# decay weights are relative to this time
+		self.points = {}	# player id: weighted points
+		self.counts = {}	# player id: tournaments in the window, players leave exactly when it drops to 0
+		self.rankIndex = RankIndex(descending=True)
+		
+	def weight(self, played):
+		if self.halfLife is None or self.reference is None:	# without dated tournaments the window is empty
+			return 1
+		return 2 ** ((played - self.reference).total_seconds() / 86400 / self.halfLife)
+		
+	def apply(self, played, url, columns, sign):
+		names = playerRegistry.names
+		weight = self.weight(played)
+		for id, p in zip(columns[0], tournamentDict[url].pointsFor(self.set.rule, columns)):
+			count = self.counts.get(id, 0) + sign
+			if count == 0:
+				del self.counts[id]
+				del self.points[id]
+				self.rankIndex.remove(names[id])
+				continue
+			self.counts[id] = count
+			points = self.points.get(id, 0) + p * weight * sign
+			self.points[id] = points
+			self.rankIndex.update(names[id], points)
+			
+	def applyRange(self, start, stop, sign):
+		for played, url in self.events[start:stop]:
+			self.apply(played, url, tournamentDict[url].columns(), sign)
+			
+	def contains(self, played):
+		if self.end is None or played > self.end:
+			return False
+		return self.days is None or played >= self.end - datetime.timedelta(days=self.days)
+		
+	def applyTournament(self, url, columns, sign):	# keeps the window in step with tournaments added to or removed from the set
+		if sign > 0:
+			played = tournamentDict[url].playedAt()
+			if played is None or url in self.played:
+				return
+			self.played[url] = played
+			position = bisect_left(self.events, (played, url))
+			self.events.insert(position, (played, url))
+			if self.reference is None:
+				self.reference = played
+			if self.contains(played):
+				self.stop += 1
+				self.apply(played, url, columns, 1)
+			elif position <= self.start:
+				self.start += 1
+				self.stop += 1
+		else:
+			played = self.played.pop(url, None)
+			if played is None:
+				return
+			position = bisect_left(self.events, (played, url))
+			del self.events[position]
+			if self.start <= position < self.stop:
+				self.stop -= 1
+				self.apply(played, url, columns, -1)
+			elif position < self.start:
+				self.start -= 1
+				self.stop -= 1
+				
+	def moveTo(self, end=None):
+		if end is None:
+			end = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+		if self.halfLife is not None and self.reference is not None and abs((end - self.reference).total_seconds()) / 86400 / self.halfLife > 500:	# keeps the weights far from overflowing
+			self.applyRange(self.start, self.stop, -1)
+			self.start = self.stop = 0
+			self.reference = end
+		start = 0
+		if self.days is not None:
+			start = bisect_left(self.events, (end - datetime.timedelta(days=self.days),))
+		stop = bisect_left(self.events, (end + datetime.timedelta(microseconds=1),))
+		if start >= self.stop or stop <= self.start:	# no overlap, start over
+			self.applyRange(self.start, self.stop, -1)
+			self.applyRange(start, stop, 1)
+		else:
+			self.applyRange(self.start, start, -1)
+			self.applyRange(start, self.start, 1)
+			self.applyRange(self.stop, stop, 1)
+			self.applyRange(stop, self.stop, -1)
+		self.start = start
+		self.stop = stop
+		self.end = end
+		return self
+		
+	def slice(self, start=0, stop=None):	# [(player, points)], decayed points as of the window's end
+		rankings = self.rankIndex.slice(start, stop)
+		if self.halfLife is None:
+			return rankings
+		scale = self.weight(self.end)
+		return [(name, round(points / scale, 2)) for name, points in rankings]
+		
+@locked
+def rankAllSets(sets=None, processes=None):	# recalculates every set in one pass over tournamentDict, returns (total seconds, {set name: seconds})
+	start = time.perf_counter()
+	if sets is None:
+		sets = list(setDict.values())
+	index = {s: i for i, s in enumerate(sets)}
+	work = []	# (player ids, ranks, [(set index, points)]) of every tournament in at least one of the sets
+	for t in tournamentDict.values():
+		targets = [s for s in t.sets if s in index]
+		if len(targets) > 0:
+			columns = t.columns()	# read once however many sets contain the tournament
+			work.append((columns[0], columns[1], [(index[s], t.pointsFor(s.rule, columns)) for s in targets]))
+	if processes is None or processes <= 1:
+		totals, seconds = rankChunk(work, len(sets))
+	else:
+		size = len(work) // processes + 1
+		totals = [({}, {}) for s in sets]
+		seconds = [0.0] * len(sets)
+		with ProcessPoolExecutor(max_workers=processes) as executor:
+			for chunkTotals, chunkSeconds in executor.map(rankChunk, [work[i:i + size] for i in range(0, len(work), size)], [len(sets)] * processes):
+				merge = time.perf_counter()
+				for i, (rankings, placements) in enumerate(chunkTotals):
+					mergeTotals(totals[i], rankings, placements)
+				share = (time.perf_counter() - merge) / len(sets)
+				for i in range(len(sets)):
+					seconds[i] += chunkSeconds[i] + share
+	report = {}
+	for i, s in enumerate(sets):
+		build = time.perf_counter()
+		s.rankings, s.placements = totals[i]
+		s.buildRankIndex()
+		s.rankingsValid = True
+		if s in changedSets:
+			s.snapshot()
+		report[s.name] = seconds[i] + time.perf_counter() - build
+	total = time.perf_counter() - start
+	metrics.observe('ranking_seconds', total, mode='batch')
+	return total, report
+	
+def rankChunk(work, count):	# ([(rankings, placements)], [seconds]) per set index, runs in pool processes too
+	totals = [({}, {}) for i in range(count)]
+	seconds = [0.0] * count
+	for ids, ranks, targets in work:
+		for i, points in targets:
+			start = time.perf_counter()
+			rankings, placements = totals[i]
+			for id, rank, p in zip(ids, ranks, points):
+				if id in rankings:
+					rankings[id] += p
+					placed = placements[id]
+					placed[rank] = placed.get(rank, 0) + 1
+				else:
+					rankings[id] = p
+					placements[id] = {rank: 1}
+			seconds[i] += time.perf_counter() - start
+	return totals, seconds
+	
+def mergeTotals(into, rankings, placements):
+	intoRankings, intoPlacements = into
+	for id, points in rankings.items():
+		if id in intoRankings:
+			intoRankings[id] += points
+			placed = intoPlacements[id]
+			for rank, count in placements[id].items():
+				placed[rank] = placed.get(rank, 0) + count
+		else:
+			intoRankings[id] = points
+			intoPlacements[id] = placements[id]
+			
+def forgetTournament(url):	# drops a tournament no set uses any more
+	if playerIndex.valid:
+		playerIndex.remove(url, tournamentDict[url].columns())
+	touch(tournamentDict.pop(url))
+	storage.tournamentRemoved(url)
+	with participantCacheLock:
+		participantCache.pop(url, None)
+		
+def loadColumns(url):
+	with participantCacheLock:
+		if url in participantCache:
+			participantCache.move_to_end(url)
+			return participantCache[url]
+	ids = array('I')
+	ranks = array('I')
+	for player, rank in storage.loadParticipants(url):
+		ids.append(playerRegistry.id(player))
+		ranks.append(rank)
+	with participantCacheLock:
+		participantCache[url] = (ids, ranks)
+		while len(participantCache) > participantCacheSize:
+			participantCache.popitem(last=False)
+	return ids, ranks
+		
+def runConcurrently(function, urls, progress=None, workers=BULK_IMPORT_WORKERS, cancelled=None):	# returns ({url: result}, {url: exception}), stops early once cancelled() is true
+	results = {}
+	errors = {}
+	done = 0
+	if len(urls) == 0:
+		return results, errors
+	with ThreadPoolExecutor(max_workers=workers) as executor:
+		futures = {executor.submit(function, url): url for url in urls}
+		for future in as_completed(futures):
+			url = futures[future]
+			error = None
+			try:
+				results[url] = future.result()
+			except Exception as e:
+				error = errors[url] = e
+			done += 1
+			if progress is not None:
+				progress(url, error, done, len(urls))
+			if cancelled is not None and cancelled():
+				for f in futures:
+					f.cancel()
+				break
+	for future, url in futures.items():	# left over after a cancel, still reported so no url goes missing
+		if url in results or url in errors:
+			continue
+		if future.cancelled():
+			errors[url] = CancelledError('Cancelled')
+		else:	# was already running, the executor waited for it
+			try:
+				results[url] = future.result()
+			except Exception as e:
+				errors[url] = e
+	return results, errors
+	
+def fetchTournaments(urls, progress=None, workers=BULK_IMPORT_WORKERS, cancelled=None):	# only touches the network, safe to run off the GUI thread
+	return runConcurrently(fetchTournament, [url for url in dict.fromkeys(urls) if url not in tournamentDict], progress, workers, cancelled)
+	
+def checkTournaments(urls=None, progress=None, workers=BULK_IMPORT_WORKERS, cancelled=None):	# returns ({url: data} for tournaments that changed, {url: exception})
+	if urls is None:
+		urls = list(tournamentDict)
+	with lock:
+		updatedAt = {url: tournamentDict[url].updatedAt for url in urls if url in tournamentDict}
+	urls = list(updatedAt)
+	changed, errors = runConcurrently(lambda url: fetchTournamentIfChanged(url, updatedAt[url]), urls, progress, workers, cancelled)
+	for url in [url for url, data in changed.items() if data is None]:
+		del changed[url]
+	return changed, errors
+	
+def refreshTournaments(urls=None, progress=None, workers=BULK_IMPORT_WORKERS):	# returns ({set name: [(player, old rank, new rank)]}, {url: exception})
+	changed, errors = checkTournaments(urls, progress, workers)
+	return applyRefresh(changed), errors
+	
+@locked
+def applyRefresh(changed):	# updates the changed tournaments and returns the rank changes per set
+	sets = []
+	for url in changed:
+		if url in tournamentDict:
+			for s in tournamentDict[url].sets:
+				if s not in sets:
+					sets.append(s)
+	before = {}
+	for s in sets:
+		before[s.name] = {name: i + 1 for i, (name, points) in enumerate(s.returnRankings())}
+	for url, data in changed.items():
+		if url in tournamentDict:
+			tournamentDict[url].update(data)
+	diffs = {}
+	for s in sets:
+		after = {name: i + 1 for i, (name, points) in enumerate(s.returnRankings())}
+		diffs[s.name] = []
+		for name in list(before[s.name]) + [n for n in after if n not in before[s.name]]:
+			if before[s.name].get(name) != after.get(name):
+				diffs[s.name].append((name, before[s.name].get(name), after.get(name)))
+	saveData()
+	return diffs
+
+class Tournament:
+	__slots__ = ('url', 'sets', 'playerIds', 'ranks', 'resultIndex', 'state', 'updatedAt', 'startedAt', 'completedAt', 'tags', 'points', 'version')
+	
+	def __init__(self, url, data=None, participants=None, lazy=False, state=None, updatedAt=None, startedAt=None, completedAt=None, tags=()):
+		self.url = url
+		self.sets = []
+		self.playerIds = None	# parallel array('I') columns, None while participants are only in the database
+		self.ranks = None
+		self.resultIndex = None
+		self.state = state
+		self.updatedAt = updatedAt
+		self.startedAt = startedAt
+		self.completedAt = completedAt
+		self.tags = frozenset(tags)	# picks the scoring tier, see tiers.py
+		self.points = {}	# scoring rule version: (weakref to player ids, points), shared by every set scoring the tournament the same way
+		touch(self)
+		if participants is not None:
+			self.setParticipants(participants)
+		elif not lazy:
+			if data is None:
+				data = fetchTournament(url)
+			self.parse(data)
+			storage.tournamentChanged(self)
+		tournamentDict[url] = self
+		if playerIndex.valid and not lazy:
+			playerIndex.add(url, self.columns())
+		
+	def parse(self, data):
+		t, p = data
+		self.state = t['state']
+		self.updatedAt = timestamp(t['updated-at'])
+		self.startedAt = timestamp(t.get('started-at'))
+		self.completedAt = timestamp(t.get('completed-at'))
+		participants = {}
+		learned = []
+		for participant in p:
+			rank = participant['final-rank']
+			player = aliasIndex.resolve(participant)
+			if rank is None or player is None:
+				continue
+			if player not in participants or rank < participants[player]:	# two entries of the same player keep the better placing
+				participants[player] = rank
+			for kind, alias, target in aliasIndex.learn(participant, player):
+				learned.append((kind, alias, target))
+				guest = aliasIndex.lookup(identity.NAME, alias) if kind == identity.USERNAME else None
+				if guest is not None and guest != player:	# a guest seen before the account it belongs to
+					guestMerges.append((guest, player))
+			if playerNgrams is not None:
+				playerNgrams.add(player)
+		if len(learned) > 0:
+			storage.aliasesAdded(learned)
+		self.setParticipants(participants)
+		
+	def setParticipants(self, participants):
+		self.playerIds = array('I')
+		self.ranks = array('I')
+		for name, rank in participants.items():
+			self.playerIds.append(playerRegistry.id(name))
+			self.ranks.append(rank)
+		self.resultIndex = None
+		touch(self)
+		
+	def playedAt(self):	# utc datetime the tournament started, or finished if it has no start time, None if challonge gave neither
+		return parseTime(self.startedAt) or parseTime(self.completedAt)
+		
+	def pointsFor(self, rule, columns=None):	# points of every participant in column order, only worked out once per rule version
+		if columns is None:
+			columns = self.columns()
+		cached = self.points.get(rule.version)
+		if cached is not None and cached[0]() is columns[0]:	# columns reloaded or replaced since then need scoring again
+			metrics.count('point_cache_total', result='hit')
+			return cached[1]
+		metrics.count('point_cache_total', result='miss')
+		points = rule.points(columns[1], self.tags)
+		cache = self.points
+		def dropped(ref):	# the columns left the participant cache, these points can't be hit again
+			if cache.get(rule.version, (None,))[0] is ref:
+				del cache[rule.version]
+		cache[rule.version] = (weakref.ref(columns[0], dropped), points)
+		return points
+		
+	@locked
+	def setTags(self, tags):	# rescored in every set containing the tournament
+		tags = frozenset(tags)
+		if tags == self.tags:
+			return
+		columns = self.columns()
+		for s in self.sets:
+			s.applyTournament(columns, -1, self.url)
+		self.tags = tags
+		self.points.clear()
+		touch(self)
+		for s in self.sets:
+			s.applyTournament(columns, 1, self.url)
+		storage.tournamentTagsChanged(self.url, sorted(tags))
+		saveData()
+		
+	def columns(self):	# (player ids, ranks)
+		if self.playerIds is not None:
+			return self.playerIds, self.ranks
+		return loadColumns(self.url)
+		
+	@property
+	def participants(self):	# {player name: rank}
+		names = playerRegistry.names
+		ids, ranks = self.columns()
+		return {names[id]: rank for id, rank in zip(ids, ranks)}
+		
+	@locked
+	def update(self, data):	# replaces the participants with freshly fetched ones and updates every set containing the tournament
+		old = self.columns()
+		self.parse(data)
+		self.changed(old)
+		
+	def replacePlayer(self, old, new):	# moves the placing of one player to another, keeping the better one if both attended
+		participants = self.participants
+		rank = participants.pop(old)
+		if new not in participants or rank < participants[new]:
+			participants[new] = rank
+		columns = self.columns()
+		self.setParticipants(participants)
+		self.changed(columns)
+		
+	def changed(self, old):
+		with participantCacheLock:
+			participantCache.pop(self.url, None)
+		if playerIndex.valid:
+			playerIndex.remove(self.url, old)
+			playerIndex.add(self.url, self.columns())
+		for s in self.sets:
+			s.applyTournament(old, -1, self.url)
+			s.applyTournament(self.columns(), 1, self.url)
+		storage.tournamentChanged(self)
+		
+	@locked
+	def returnResults(self, start=0, stop=None):
+		if self.resultIndex is None:
+			self.resultIndex = RankIndex(self.participants)
+		return self.resultIndex.slice(start, stop)
+		
+def playerPlacements(name):	# [(url, rank)] of every tournament the player attended, best first
+	return sorted(playerIndex.get(name).items(), key=lambda x: (x[1], x[0]))
+	
+def playerAttendance(name):
+	return len(playerIndex.get(name))
+	
+def bestFinishes(name, count=3):
+	return playerPlacements(name)[:count]
+	
+@locked
+def playerSets(name):	# {set name: (points, events attended, best placing)} of the sets the player has placings in
+	sets = {}
+	for url in playerIndex.get(name):
+		for s in tournamentDict[url].sets:
+			if s.name not in sets:
+				sets[s.name] = s.playerStats(name)
+	return sets
+	
+def searchPlayers(prefix, limit=20):
+	return playerIndex.search(prefix, limit)
+	
+def headToHead(name, opponent):	# (wins, losses, draws) in the stored match results, see ratings.py
+	return storage.headToHead(name, opponent)
+	
+@locked
+def mergePlayers(alias, player):	# alias and all of its placings become player's from now on
+	player = aliasIndex.lookup(identity.USERNAME, player) or aliasIndex.lookup(identity.NAME, player) or player	# player may have been merged away itself
+	if alias == player:
+		return
+	aliasIndex.retarget(alias, player)
+	rows = [(identity.USERNAME, alias, player), (identity.NAME, alias, player)]
+	for kind, name, target in rows:
+		aliasIndex.add(kind, name, target)
+	storage.playerMerged(alias, player)
+	storage.aliasesAdded(rows)
+	for url in storage.playerTournaments(alias):
+		if url in tournamentDict:
+			tournamentDict[url].replacePlayer(alias, player)
+	if playerNgrams is not None:
+		playerNgrams.remove(alias)
+		playerNgrams.add(player)
+	saveData()
+	
+@locked
+def similarPlayers(name, threshold=0.6, limit=10):
+	return ngramIndex().similar(name, threshold, limit)
+	
+@locked
+def mergeSuggestions(threshold=0.6, limit=100):
+	return ngramIndex().suggestions(threshold, limit)
+	
+@locked
+def ngramIndex():
+	global playerNgrams
+	if playerNgrams is None:
+		playerNgrams = identity.NgramIndex(storage.loadPlayers())
+	return playerNgrams
+		
+def loadConfig():
+	if config.configExists():
+		config.loadConfig()
+		cache.maxSize = config.responseCacheSize() * 1024 * 1024
+		cache.ttl = config.responseCacheTTL()
+		if config.apiUrl() is not None:
+			fetch.setBaseUrl(config.apiUrl())
+		fetch.setCredentials(config.config['challonge']['username'], config.config['challonge']['apiKey'])
+	else:
+		pass
@@ -0,0 +1,159 @@
+import json
+import math
+from . import storage
+from .fetch import fetchMatches, parseTime
+from .model import aliasIndex, tournamentDict, runConcurrently, saveData, BULK_IMPORT_WORKERS
+
+# glicko-2 with every tournament as one rating period, see http://www.glicko.net/glicko/glicko2.pdf
+
+SCALE = 173.7178
+DEFAULT_RATING = 1500
+DEFAULT_DEVIATION = 350
+DEFAULT_VOLATILITY = 0.06
+TAU = 0.5	# how much volatility can change, 0.3 to 1.2 are sensible
+CHECKPOINT_INTERVAL = 16	# periods between stored checkpoints, the latest period always gets one
+
+class Glicko2:
+	def __init__(self, players=None, periods=0):
+		self.players = players or {}	# player: [mu, phi, sigma, period of the last game]
+		self.periods = periods
+		
+	def dumps(self):
+		return json.dumps({'periods': self.periods, 'players': self.players}, separators=(',', ':'))
+		
+	@classmethod
+	def loads(cls, state):
+		state = json.loads(state)
+		return cls(state['players'], state['periods'])
+		
+	def current(self, player, period):	# (mu, phi, sigma) at the start of period, deviation grows by sigma for every period without games
+		if player not in self.players:
+			return 0.0, DEFAULT_DEVIATION / SCALE, DEFAULT_VOLATILITY
+		mu, phi, sigma, last = self.players[player]
+		idle = period - last - 1
+		return mu, min(math.sqrt(phi * phi + idle * sigma * sigma), DEFAULT_DEVIATION / SCALE), sigma
+		
+	def rating(self, player):	# (rating, deviation, volatility) as of now
+		mu, phi, sigma = self.current(player, self.periods)
+		return DEFAULT_RATING + SCALE * mu, SCALE * phi, sigma
+		
+	def ratings(self):	# [(player, rating, deviation)] highest rating first
+		ratings = []
+		for player in self.players:
+			rating, deviation, sigma = self.rating(player)
+			ratings.append((player, rating, deviation))
+		ratings.sort(key=lambda x: (-x[1], x[0]))
+		return ratings
+		
+	def period(self, matches):	# rates one period of (player1, player2, player1's score) matches, everyone is rated against their opponents' ratings from before it
+		games = {}
+		for player1, player2, score in matches:
+			games.setdefault(player1, []).append((player2, score))
+			games.setdefault(player2, []).append((player1, 1 - score))
+		period = self.periods
+		before = {player: self.current(player, period) for player in games}
+		for player, results in games.items():
+			mu, phi, sigma = before[player]
+			v = 0.0
+			delta = 0.0
+			for opponent, score in results:
+				muJ, phiJ, sigmaJ = before[opponent]
+				g = 1 / math.sqrt(1 + 3 * phiJ * phiJ / (math.pi * math.pi))
+				e = 1 / (1 + math.exp(-g * (mu - muJ)))
+				v += g * g * e * (1 - e)
+				delta += g * (score - e)
+			v = 1 / v
+			delta *= v
+			sigma = volatility(phi, sigma, v, delta)
+			phi = 1 / math.sqrt(1 / (phi * phi + sigma * sigma) + 1 / v)
+			mu += phi * phi * delta / v
+			self.players[player] = [mu, phi, sigma, period]
+		self.periods += 1
+		
+def volatility(phi, sigma, v, delta):	# step 5 of the paper, the illinois algorithm
+	a = math.log(sigma * sigma)
+	def f(x):
+		ex = math.exp(x)
+		return ex * (delta * delta - phi * phi - v - ex) / (2 * (phi * phi + v + ex) ** 2) - (x - a) / (TAU * TAU)
+	A = a
+	if delta * delta > phi * phi + v:
+		B = math.log(delta * delta - phi * phi - v)
+	else:
+		k = 1
+		while f(a - k * TAU) < 0:
+			k += 1
+		B = a - k * TAU
+	fA = f(A)
+	fB = f(B)
+	while abs(B - A) > 0.000001:
+		C = A + (A - B) * fA / (fB - fA)
+		fC = f(C)
+		if fC * fB <= 0:
+			A, fA = B, fB
+		else:
+			fA /= 2
+		B, fB = C, fC
+	return math.exp(A / 2)
+	
+def playedAt(t):	# utc time the tournament's period is ordered by
+	for key in ('started-at', 'completed-at', 'created-at'):
+		played = parseTime(t.get(key))
+		if played is not None:
+			return played.isoformat()
+	return None
+	
+def parseMatches(data):	# (played at, [(player1, player2, player1's score)]) of the completed matches between identified players
+	t, participants, matches = data
+	players = {}
+	for participant in participants:
+		player = aliasIndex.resolve(participant)
+		if player is not None:
+			players[participant['id']] = player
+	results = []
+	for m in matches:
+		if m['state'] != 'complete' or m.get('player1-id') not in players or m.get('player2-id') not in players:
+			continue
+		player1 = players[m['player1-id']]
+		player2 = players[m['player2-id']]
+		if player1 == player2:
+			continue
+		if m.get('winner-id') is None:
+			score = 0.5
+		elif m['winner-id'] == m['player1-id']:
+			score = 1.0
+		else:
+			score = 0.0
+		results.append((player1, player2, score))
+	return playedAt(t), results
+	
+def fetchNewMatches(urls, progress=None, workers=BULK_IMPORT_WORKERS, cancelled=None):	# stores the matches of tournaments that have none yet or were refreshed since, returns {url: exception}
+	matchLists = storage.loadMatchLists()
+	stale = [url for url in urls if url not in matchLists or matchLists[url][1] != tournamentDict[url].updatedAt]
+	fetched, errors = runConcurrently(fetchMatches, stale, progress, workers, cancelled)
+	for url, data in fetched.items():
+		played, results = parseMatches(data)
+		storage.matchesChanged(url, played, tournamentDict[url].updatedAt, results)
+	saveData()
+	return errors
+	
+def updateRatings(set, progress=None, workers=BULK_IMPORT_WORKERS, cancelled=None):	# returns (Glicko2, {url: exception}), only periods after the last unchanged checkpoint are rated again
+	errors = fetchNewMatches(list(set.tournaments), progress, workers, cancelled)
+	matchLists = storage.loadMatchLists()
+	order = sorted((matchLists[url][0] or '', url) for url in set.tournaments if url in matchLists)
+	periods = [(url, matchLists[url][1]) for played, url in order]
+	stored = [tuple(period) for period in storage.loadRatingPeriods(set.name)]
+	unchanged = 0
+	while unchanged < min(len(periods), len(stored)) and periods[unchanged] == stored[unchanged]:
+		unchanged += 1
+	start, state = storage.loadRatingCheckpoint(set.name, unchanged)
+	if state is None:
+		ratings = Glicko2()
+	else:
+		ratings = Glicko2.loads(state)
+	storage.ratingPeriodsChanged(set.name, periods, start)
+	for position in range(start, len(periods)):
+		ratings.period(storage.loadMatches(periods[position][0]))
+		if ratings.periods % CHECKPOINT_INTERVAL == 0 or ratings.periods == len(periods):
+			storage.ratingCheckpoint(set.name, ratings.periods, ratings.dumps())
+	saveData()
+	return ratings, errors
@@ -0,0 +1,50 @@
+def numpy():	# numpy is optional, only the scoring comparison needs it
+	try:
+		import numpy
+	except ImportError:
+		raise ImportError('Comparing scorings requires numpy (pip install numpy)')
+	return numpy
+
+def placementMatrix(set):	# returns (players sorted by name, counts) where counts[i, r - 1] is how often players[i] placed r-th
+	np = numpy()
+	from .model import playerRegistry
+	set.returnRankings()	# makes sure the placement counts are built
+	ids = sorted(set.placements, key=playerRegistry.name)
+	maxRank = 0
+	for placements in set.placements.values():
+		maxRank = max(maxRank, max(placements))
+	counts = np.zeros((len(ids), maxRank), dtype=np.int64)
+	for i, id in enumerate(ids):
+		for rank, count in set.placements[id].items():
+			counts[i, rank - 1] = count
+	return [playerRegistry.name(id) for id in ids], counts
+
+def scoringMatrix(scorings, maxRank):	# one column of points per placing for every scoring, zero past the end of each
+	np = numpy()
+	matrix = np.zeros((maxRank, len(scorings)), dtype=np.int64)
+	for j, scoring in enumerate(scorings):
+		points = scoring[:maxRank]
+		matrix[:len(points), j] = points
+	return matrix
+
+def rankAll(set, scorings):	# returns (players, totals, ranks), totals[i, j] and ranks[i, j] are for players[i] under scorings[j]
+	np = numpy()
+	players, counts = placementMatrix(set)
+	totals = counts @ scoringMatrix(scorings, counts.shape[1])
+	ranks = np.empty(totals.shape, dtype=np.int64)
+	for j in range(len(scorings)):
+		order = np.argsort(-totals[:, j], kind='stable')	# players are sorted by name, so ties keep RankIndex order
+		ranks[order, j] = np.arange(1, len(players) + 1)
+	return players, totals, ranks
+
+def compareScorings(set, scorings, top=10):	# returns (top lists per scoring, {player: [rank per scoring]} for everyone in any top list)
+	np = numpy()
+	players, totals, ranks = rankAll(set, scorings)
+	tops = []
+	movement = {}
+	for j in range(len(scorings)):
+		order = np.argsort(ranks[:, j])[:top]
+		tops.append([(players[i], int(totals[i, j])) for i in order])
+		for i in order:
+			movement[players[i]] = [int(r) for r in ranks[i]]
+	return tops, movement
@@ -0,0 +1,168 @@
+import json
+import time
+import uuid
+import threading
+import urllib.parse
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from . import model
+from . import storage
+from . import metrics
+
+# Read-only json api of the leaderboards for stream overlays and websites, started by the serve command:
+#	GET /sets	GET /sets/NAME?start=0&stop=100	GET /tournaments/URL	GET /players?search=PREFIX&limit=20	GET /players/NAME	GET /metrics
+# Bodies are built once per version of the data they show (see model.touch) and kept in memory with that version in their ETag,
+# so polling clients are answered from memory or with 304 until a set or tournament changes.
+
+CACHE_SIZE = 1024	# response bodies kept, least recently used are dropped first
+
+class HTTPError(Exception):
+	def __init__(self, status, message):
+		super().__init__(message)
+		self.status = status
+
+def intParam(query, name, default=None):
+	if name not in query:
+		return default
+	try:
+		return int(query[name])
+	except ValueError:
+		raise HTTPError(400, '{} must be an integer'.format(name))
+
+def setList():
+	return {'sets': [{'name': s.name, 'tournaments': len(s.tournaments), 'scoring': s.scoring} for s in model.setDict.values()]}
+
+def leaderboard(s, start, stop):
+	rankings = s.returnRankings(start, stop)
+	return {'set': s.name, 'scoring': s.scoring, 'tournaments': len(s.tournaments), 'players': len(s.rankIndex),
+		'rankings': [{'rank': start + i + 1, 'player': player, 'points': points} for i, (player, points) in enumerate(rankings)]}
+
+def results(t):
+	return {'url': t.url, 'state': t.state, 'startedAt': t.startedAt, 'completedAt': t.completedAt, 'tags': sorted(t.tags),
+		'results': [{'rank': rank, 'player': player} for player, rank in t.returnResults()]}
+
+def player(name):
+	placements = model.playerPlacements(name)
+	if len(placements) == 0:
+		raise HTTPError(404, 'No player named {}'.format(name))
+	return {'player': name, 'events': len(placements), 'placements': [{'url': url, 'rank': rank} for url, rank in placements],
+		'sets': {setName: {'points': points, 'events': events, 'best': best} for setName, (points, events, best) in model.playerSets(name).items()}}
+
+def resolve(path, query):	# (cache key, version, function building the body) of a request
+	parts = [urllib.parse.unquote(part) for part in path.strip('/').split('/')]
+	if parts == ['sets']:
+		return 'sets', model.dataVersion, setList
+	if len(parts) == 2 and parts[0] == 'sets':
+		s = model.setDict.get(parts[1])
+		if s is None:
+			raise HTTPError(404, 'No set named {}'.format(parts[1]))
+		start = max(0, intParam(query, 'start', 0))
+		stop = intParam(query, 'stop')
+		return ('set', s.name, start, stop), s.version, lambda: leaderboard(s, start, stop)
+	if len(parts) == 2 and parts[0] == 'tournaments':
+		t = model.tournamentDict.get(parts[1])
+		if t is None:
+			raise HTTPError(404, 'No tournament {}'.format(parts[1]))
+		return ('tournament', t.url), t.version, lambda: results(t)
+	if parts == ['players']:
+		prefix = query.get('search', '')
+		limit = intParam(query, 'limit', 20)
+		return ('search', prefix, limit), model.dataVersion, lambda: {'players': model.searchPlayers(prefix, limit)}
+	if len(parts) == 2 and parts[0] == 'players':
+		return ('player', parts[1]), model.dataVersion, lambda: player(parts[1])
+	raise HTTPError(404, 'Not found')
+
+class LeaderboardServer(ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self, address):
+		super().__init__(address, Handler)
+		self.lock = threading.RLock()	# held while the model is read or changed, the model itself isn't thread safe
+		self.cache = OrderedDict()	# key: (version, etag, body)
+		self.stopped = threading.Event()
+		self.nonce = uuid.uuid4().hex[:12]	# versions start over with every process, so etags from before a restart never match
+
+	def response(self, path, query):	# (etag, body) of a request, built only if the data changed since it was last asked for
+		with self.lock:
+			key, version, build = resolve(path, query)
+			entry = self.cache.get(key)
+			if entry is not None and entry[0] == version:
+				self.cache.move_to_end(key)
+				metrics.count('server_cache_total', result='hit')
+				return entry[1], entry[2]
+			metrics.count('server_cache_total', result='miss')
+			with metrics.timer('server_build_seconds'):
+				body = json.dumps(build(), separators=(',', ':')).encode()
+			entry = self.cache[key] = (version, '"{}-{}"'.format(self.nonce, version), body)
+			self.cache.move_to_end(key)
+			while len(self.cache) > CACHE_SIZE:
+				self.cache.popitem(last=False)
+			return entry[1], entry[2]
+
+	def warm(self):	# builds the set list and every full leaderboard up front so the first clients don't wait
+		self.response('/sets', {})
+		for name in list(model.setDict):
+			self.response('/sets/' + urllib.parse.quote(name, safe=''), {})
+
+	def watch(self, reload, refresh):	# reloads the data when another process saved changes, refreshes changed tournaments every refresh seconds
+		seen = storage.dataVersion()
+		refreshed = time.monotonic()
+		while not self.stopped.wait(min(x for x in (reload, refresh) if x > 0)):
+			if refresh > 0 and time.monotonic() - refreshed >= refresh:
+				refreshed = time.monotonic()
+				changed, errors = model.checkTournaments()	# only touches the network
+				with self.lock:
+					model.applyRefresh(changed)
+			if reload > 0:
+				version = storage.dataVersion()	# own commits don't change it
+				if version != seen:
+					seen = version
+					with self.lock:
+						model.loadData()
+					self.warm()
+
+	def serve(self, reload=2, refresh=0):
+		if reload > 0 or refresh > 0:
+			threading.Thread(target=self.watch, args=(reload, refresh), daemon=True).start()
+		try:
+			self.serve_forever()
+		finally:
+			self.stopped.set()
+			self.server_close()
+
+class Handler(BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'	# keep-alive, polling clients reuse their connection
+	disable_nagle_algorithm = True
+
+	def log_message(self, *args):
+		pass
+
+	def do_GET(self):
+		start = time.perf_counter()
+		parts = urllib.parse.urlsplit(self.path)
+		query = dict(urllib.parse.parse_qsl(parts.query))
+		if parts.path.rstrip('/') == '/metrics':
+			self.reply(200, metrics.toPrometheus().encode(), contentType='text/plain; version=0.0.4')
+			return
+		try:
+			etag, body = self.server.response(parts.path, query)
+		except HTTPError as e:
+			self.reply(e.status, json.dumps({'error': str(e)}).encode())
+		else:
+			if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+				self.reply(304, b'', etag)
+			else:
+				self.reply(200, body, etag)
+		metrics.observe('server_request_seconds', time.perf_counter() - start)
+
+	def reply(self, status, body, etag=None, contentType='application/json'):
+		metrics.count('server_requests_total', status=status)
+		self.send_response(status)
+		if etag is not None:
+			self.send_header('ETag', etag)
+			self.send_header('Cache-Control', 'no-cache')	# clients revalidate every time, which costs a 304
+		self.send_header('Access-Control-Allow-Origin', '*')	# overlays and websites fetch from other origins
+		self.send_header('Content-Type', contentType)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
@@ -0,0 +1,341 @@
+import sqlite3
+import threading
+import json
+import os
+import pickle
+import time
+from .identity import normalize
+from . import metrics
+
+dbPath = 'userdata/hypestrankings.db'
+legacySetsPath = 'userdata/setlist.pickle'
+legacyTournamentsPath = 'userdata/tournamentlist.pickle'
+
+connection = None
+lock = threading.RLock()
+pending = []	# writes queued by the model, flushed in a single transaction by commit()
+
+def connect():
+	global connection
+	with lock:
+		if connection is None:
+			if os.path.exists('userdata/') is False:
+				os.makedirs('userdata')
+			connection = sqlite3.connect(dbPath, check_same_thread=False)
+			connection.execute('PRAGMA journal_mode=WAL')
+			connection.execute('PRAGMA synchronous=NORMAL')
+			connection.execute('PRAGMA foreign_keys=ON')
+			createTables(connection)
+		return connection
+
+def close():
+	global connection
+	with lock:
+		if connection is not None:
+			connection.close()
+			connection = None
+
+def usernameAliases(conn):	# players stored before aliases existed were all challonge usernames
+	conn.executemany('INSERT OR IGNORE INTO aliases (kind, alias, player) VALUES (?, ?, ?)',
+		[('username', normalize(player), player) for (player,) in conn.execute('SELECT DISTINCT player FROM participants').fetchall()])
+
+def tournamentTimes(conn):	# taken from cached responses where there are some, other tournaments get theirs when refreshed
+	from . import cache
+	from .fetch import timestamp
+	rows = []
+	for (url,) in conn.execute('SELECT url FROM tournaments').fetchall():
+		entry = cache.get('tournaments.show', url)
+		if entry is not None:
+			rows.append((timestamp(entry['data'].get('started-at')), timestamp(entry['data'].get('completed-at')), url))
+	conn.executemany('UPDATE tournaments SET started_at = ?, completed_at = ? WHERE url = ?', rows)
+
+migrations = [	# schema changes applied in order on top of the original tables, tracked in PRAGMA user_version
+	['ALTER TABLE tournaments ADD COLUMN state TEXT', 'ALTER TABLE tournaments ADD COLUMN updated_at TEXT'],
+	['''CREATE TABLE aliases (
+		kind TEXT NOT NULL,
+		alias TEXT NOT NULL,
+		player TEXT NOT NULL,
+		PRIMARY KEY (kind, alias))''', 'CREATE INDEX participants_player ON participants(player)', usernameAliases],
+	['''CREATE TABLE match_lists (
+		url TEXT PRIMARY KEY REFERENCES tournaments(url) ON DELETE CASCADE,
+		played_at TEXT,
+		updated_at TEXT)''', '''CREATE TABLE matches (
+		url TEXT NOT NULL REFERENCES match_lists(url) ON DELETE CASCADE,
+		player1 TEXT NOT NULL,
+		player2 TEXT NOT NULL,
+		score REAL NOT NULL)''', 'CREATE INDEX matches_url ON matches(url)', '''CREATE TABLE rating_periods (
+		set_name TEXT NOT NULL REFERENCES sets(name) ON DELETE CASCADE ON UPDATE CASCADE,
+		position INTEGER NOT NULL,
+		url TEXT NOT NULL,
+		updated_at TEXT,
+		PRIMARY KEY (set_name, position))''', '''CREATE TABLE rating_checkpoints (
+		set_name TEXT NOT NULL REFERENCES sets(name) ON DELETE CASCADE ON UPDATE CASCADE,
+		position INTEGER NOT NULL,
+		state TEXT NOT NULL,
+		PRIMARY KEY (set_name, position))'''],
+	['CREATE INDEX matches_players ON matches(player1, player2)'],
+	['ALTER TABLE tournaments ADD COLUMN started_at TEXT', 'ALTER TABLE tournaments ADD COLUMN completed_at TEXT', tournamentTimes],
+	['''CREATE TABLE tournament_tags (
+		url TEXT NOT NULL REFERENCES tournaments(url) ON DELETE CASCADE,
+		tag TEXT NOT NULL,
+		PRIMARY KEY (url, tag))'''],
+	['''CREATE TABLE leaderboard_snapshots (
+		set_name TEXT NOT NULL REFERENCES sets(name) ON DELETE CASCADE ON UPDATE CASCADE,
+		position INTEGER NOT NULL,
+		taken_at TEXT NOT NULL,
+		checkpoint INTEGER NOT NULL,
+		changes TEXT NOT NULL,
+		PRIMARY KEY (set_name, position))''', 'CREATE INDEX leaderboard_snapshots_time ON leaderboard_snapshots(set_name, taken_at, position)'],
+]
+
+def createTables(conn):
+	with conn:
+		conn.execute('''CREATE TABLE IF NOT EXISTS sets (
+			name TEXT PRIMARY KEY,
+			scoring TEXT NOT NULL)''')
+		conn.execute('''CREATE TABLE IF NOT EXISTS tournaments (
+			url TEXT PRIMARY KEY)''')
+		conn.execute('''CREATE TABLE IF NOT EXISTS participants (
+			url TEXT NOT NULL REFERENCES tournaments(url) ON DELETE CASCADE,
+			player TEXT NOT NULL,
+			rank INTEGER NOT NULL,
+			PRIMARY KEY (url, player))''')
+		conn.execute('''CREATE TABLE IF NOT EXISTS set_tournaments (
+			set_name TEXT NOT NULL REFERENCES sets(name) ON DELETE CASCADE ON UPDATE CASCADE,
+			url TEXT NOT NULL REFERENCES tournaments(url) ON DELETE CASCADE,
+			PRIMARY KEY (set_name, url))''')
+		version = conn.execute('PRAGMA user_version').fetchone()[0]
+		for statements in migrations[version:]:
+			for sql in statements:
+				if callable(sql):
+					sql(conn)
+				else:
+					conn.execute(sql)
+		conn.execute('PRAGMA user_version = {}'.format(len(migrations)))
+
+def isEmpty():
+	with lock:
+		return connect().execute('SELECT COUNT(*) FROM sets').fetchone()[0] == 0
+
+def dataVersion():	# changes when another connection commits, e.g. the gui while the server is running
+	with lock:
+		return connect().execute('PRAGMA data_version').fetchone()[0]
+
+def deleteDatabase():
+	with lock:
+		close()
+		del pending[:]
+		for path in [dbPath, dbPath + '-wal', dbPath + '-shm', legacySetsPath, legacyTournamentsPath]:
+			if os.path.isfile(path):
+				os.remove(path)
+
+# values are captured when the change is queued so later mutations can't reorder them
+
+def setChanged(set):
+	pending.append(('INSERT INTO sets (name, scoring) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET scoring = excluded.scoring',
+		[(set.name, json.dumps(set.scoring))]))
+
+def setRenamed(oldName, newName):
+	pending.append(('UPDATE sets SET name = ? WHERE name = ?', [(newName, oldName)]))
+
+def setRemoved(name):
+	pending.append(('DELETE FROM sets WHERE name = ?', [(name,)]))
+
+def tournamentChanged(tournament):
+	pending.append(('''INSERT INTO tournaments (url, state, updated_at, started_at, completed_at) VALUES (?, ?, ?, ?, ?) ON CONFLICT(url) DO UPDATE SET
+		state = excluded.state, updated_at = excluded.updated_at, started_at = excluded.started_at, completed_at = excluded.completed_at''',
+		[(tournament.url, tournament.state, tournament.updatedAt, tournament.startedAt, tournament.completedAt)]))
+	pending.append(('DELETE FROM participants WHERE url = ?', [(tournament.url,)]))
+	pending.append(('INSERT INTO participants (url, player, rank) VALUES (?, ?, ?)',
+		[(tournament.url, player, rank) for player, rank in tournament.participants.items()]))
+
+def tournamentTagsChanged(url, tags):
+	pending.append(('DELETE FROM tournament_tags WHERE url = ?', [(url,)]))
+	pending.append(('INSERT INTO tournament_tags (url, tag) VALUES (?, ?)', [(url, tag) for tag in tags]))
+
+def tournamentRemoved(url):
+	pending.append(('DELETE FROM tournaments WHERE url = ?', [(url,)]))
+
+def setTournamentAdded(setName, url):
+	pending.append(('INSERT OR IGNORE INTO set_tournaments (set_name, url) VALUES (?, ?)', [(setName, url)]))
+
+def setTournamentRemoved(setName, url):
+	pending.append(('DELETE FROM set_tournaments WHERE set_name = ? AND url = ?', [(setName, url)]))
+
+def aliasesAdded(rows):	# (kind, alias, player)
+	pending.append(('INSERT INTO aliases (kind, alias, player) VALUES (?, ?, ?) ON CONFLICT(kind, alias) DO UPDATE SET player = excluded.player',
+		[(kind, normalize(alias), player) for kind, alias, player in rows]))
+
+def playerMerged(old, new):	# ratings are replayed from the stored matches next time
+	pending.append(('UPDATE aliases SET player = ? WHERE player = ?', [(new, old)]))
+	pending.append(('UPDATE matches SET player1 = ? WHERE player1 = ?', [(new, old)]))
+	pending.append(('UPDATE matches SET player2 = ? WHERE player2 = ?', [(new, old)]))
+	pending.append(('DELETE FROM rating_checkpoints', [()]))
+
+def matchesChanged(url, playedAt, updatedAt, matches):	# matches are (player1, player2, player1's score)
+	pending.append(('INSERT INTO match_lists (url, played_at, updated_at) VALUES (?, ?, ?) ON CONFLICT(url) DO UPDATE SET played_at = excluded.played_at, updated_at = excluded.updated_at',
+		[(url, playedAt, updatedAt)]))
+	pending.append(('DELETE FROM matches WHERE url = ?', [(url,)]))
+	pending.append(('INSERT INTO matches (url, player1, player2, score) VALUES (?, ?, ?, ?)', [(url,) + tuple(m) for m in matches]))
+
+def ratingPeriodsChanged(setName, periods, start):	# periods are (url, updated at) in the order they were rated, checkpoints after start are stale
+	pending.append(('DELETE FROM rating_periods WHERE set_name = ?', [(setName,)]))
+	pending.append(('INSERT INTO rating_periods (set_name, position, url, updated_at) VALUES (?, ?, ?, ?)',
+		[(setName, i, url, updatedAt) for i, (url, updatedAt) in enumerate(periods)]))
+	pending.append(('DELETE FROM rating_checkpoints WHERE set_name = ? AND position > ?', [(setName, start)]))
+
+def ratingCheckpoint(setName, position, state):
+	pending.append(('INSERT OR REPLACE INTO rating_checkpoints (set_name, position, state) VALUES (?, ?, ?)', [(setName, position, state)]))
+
+def snapshotTaken(setName, position, takenAt, checkpoint, changes):	# changes are the json of {player: points}, the whole leaderboard for checkpoints
+	pending.append(('INSERT OR REPLACE INTO leaderboard_snapshots (set_name, position, taken_at, checkpoint, changes) VALUES (?, ?, ?, ?, ?)',
+		[(setName, position, takenAt, int(checkpoint), changes)]))
+
+def commit():	# all queued writes succeed or none do
+	with lock:
+		if len(pending) == 0:
+			return
+		conn = connect()
+		start = time.perf_counter()
+		with conn:
+			for sql, rows in pending:
+				conn.executemany(sql, rows)
+		metrics.observe('save_seconds', time.perf_counter() - start)
+		metrics.count('saves_total')
+		metrics.count('save_rows_total', sum(len(rows) for sql, rows in pending))
+		metrics.count('save_bytes_total', sum(rowSize(row) for sql, rows in pending for row in rows))
+		del pending[:]
+
+def rowSize(row):	# bytes of values written, what sqlite stores before its own overhead
+	size = 0
+	for value in row:
+		if isinstance(value, str):
+			size += len(value.encode('utf-8'))
+		elif isinstance(value, bytes):
+			size += len(value)
+		elif value is not None:
+			size += 8
+	return size
+
+class LegacyObject:
+	pass
+
+class LegacyUnpickler(pickle.Unpickler):	# the old pickles were written from main.py, so their classes were saved as __main__.Set/Tournament
+	def find_class(self, module, name):
+		if name in ('Set', 'Tournament'):
+			return LegacyObject
+		return super().find_class(module, name)
+		
+def loadLegacyPickle(path):
+	if os.path.isfile(path):
+		with open(path, 'rb') as f:
+			return LegacyUnpickler(f).load()
+	return {}
+
+def migratePickles():	# pickle files are only read once, to copy them into the database
+	with lock:
+		for url, t in loadLegacyPickle(legacyTournamentsPath).items():
+			pending.append(('INSERT OR IGNORE INTO tournaments (url) VALUES (?)', [(url,)]))
+			pending.append(('INSERT OR IGNORE INTO participants (url, player, rank) VALUES (?, ?, ?)',
+				[(url, player, rank) for player, rank in t.participants.items()]))
+			pending.append(('INSERT OR IGNORE INTO aliases (kind, alias, player) VALUES (?, ?, ?)',
+				[('username', normalize(player), player) for player in t.participants]))
+		for name, s in loadLegacyPickle(legacySetsPath).items():
+			pending.append(('INSERT OR IGNORE INTO sets (name, scoring) VALUES (?, ?)', [(name, json.dumps(s.scoring))]))
+			pending.append(('INSERT OR IGNORE INTO set_tournaments (set_name, url) VALUES (?, ?)', [(name, url) for url in s.tournaments]))
+		commit()
+		for path in [legacySetsPath, legacyTournamentsPath]:
+			if os.path.isfile(path):
+				os.replace(path, path + '.migrated')
+
+def loadSets():
+	with lock:
+		return [(name, json.loads(scoring)) for name, scoring in connect().execute('SELECT name, scoring FROM sets ORDER BY rowid')]
+
+def loadSetTournaments():
+	with lock:
+		return connect().execute('SELECT set_name, url FROM set_tournaments ORDER BY rowid').fetchall()
+
+def loadTournamentIndex():
+	with lock:
+		return connect().execute('SELECT url, state, updated_at, started_at, completed_at FROM tournaments ORDER BY rowid').fetchall()
+
+def loadTournamentTags():	# {url: [tag]}
+	with lock:
+		tags = {}
+		for url, tag in connect().execute('SELECT url, tag FROM tournament_tags'):
+			tags.setdefault(url, []).append(tag)
+		return tags
+
+def loadAliases():
+	with lock:
+		return connect().execute('SELECT kind, alias, player FROM aliases').fetchall()
+
+def loadPlayers():
+	with lock:
+		return [player for (player,) in connect().execute('SELECT DISTINCT player FROM participants')]
+
+def playerTournaments(player):
+	with lock:
+		return [url for (url,) in connect().execute('SELECT url FROM participants WHERE player = ?', (player,))]
+
+def loadMatchLists():
+	with lock:
+		return {url: (playedAt, updatedAt) for url, playedAt, updatedAt in connect().execute('SELECT url, played_at, updated_at FROM match_lists')}
+
+def loadMatches(url):
+	with lock:
+		return connect().execute('SELECT player1, player2, score FROM matches WHERE url = ? ORDER BY rowid', (url,)).fetchall()
+
+def loadRatingPeriods(setName):
+	with lock:
+		return connect().execute('SELECT url, updated_at FROM rating_periods WHERE set_name = ? ORDER BY position', (setName,)).fetchall()
+
+def loadRatingCheckpoint(setName, position):	# the latest checkpoint at or before position, (0, None) if there isn't one
+	with lock:
+		row = connect().execute('SELECT position, state FROM rating_checkpoints WHERE set_name = ? AND position <= ? ORDER BY position DESC LIMIT 1',
+			(setName, position)).fetchone()
+	if row is None:
+		return 0, None
+	return row
+
+def lastSnapshot(setName):	# (position of the latest snapshot, position of the latest checkpoint), 0 if there are none
+	with lock:
+		return connect().execute('''SELECT COALESCE(MAX(position), 0), COALESCE(MAX(CASE WHEN checkpoint THEN position END), 0)
+			FROM leaderboard_snapshots WHERE set_name = ?''', (setName,)).fetchone()
+
+def loadSnapshots(setName, at=None):	# (checkpoint, changes) from the last checkpoint up to the latest snapshot taken at or before at
+	with lock:
+		conn = connect()
+		if at is None:
+			row = conn.execute('SELECT MAX(position) FROM leaderboard_snapshots WHERE set_name = ?', (setName,)).fetchone()
+		else:
+			row = conn.execute('''SELECT position FROM leaderboard_snapshots WHERE set_name = ? AND taken_at <= ?
+				ORDER BY taken_at DESC, position DESC LIMIT 1''', (setName, at)).fetchone()
+		if row is None or row[0] is None:
+			return []
+		start = conn.execute('SELECT COALESCE(MAX(position), 0) FROM leaderboard_snapshots WHERE set_name = ? AND checkpoint AND position <= ?',
+			(setName, row[0])).fetchone()[0]
+		return conn.execute('SELECT checkpoint, changes FROM leaderboard_snapshots WHERE set_name = ? AND position BETWEEN ? AND ? ORDER BY position',
+			(setName, start, row[0])).fetchall()
+
+def headToHead(player, opponent):
+	with lock:
+		wins, losses, draws = connect().execute('''SELECT
+			COALESCE(SUM(score = 1), 0), COALESCE(SUM(score = 0), 0), COALESCE(SUM(score = 0.5), 0) FROM (
+			SELECT score FROM matches WHERE player1 = ? AND player2 = ?
+			UNION ALL SELECT 1 - score FROM matches WHERE player1 = ? AND player2 = ?)''', (player, opponent, opponent, player)).fetchone()
+	return wins, losses, draws
+
+def loadParticipants(url):
+	with lock:
+		return connect().execute('SELECT player, rank FROM participants WHERE url = ? ORDER BY rowid', (url,)).fetchall()
+
+def loadTournaments():
+	with lock:
+		tournaments = {}
+		for (url,) in connect().execute('SELECT url FROM tournaments ORDER BY rowid'):
+			tournaments[url] = {}
+		for url, player, rank in connect().execute('SELECT url, player, rank FROM participants ORDER BY rowid'):
+			tournaments[url][player] = rank
+		return tournaments
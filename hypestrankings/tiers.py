@@ -0,0 +1,71 @@
+import json
+
+# A set's scoring is either a flat list of points per placing, or tiers picked per tournament:
+# {"points": [15, 12, 10], "tiers": [{"tag": "major", "multiplier": 2}, {"minEntrants": 64, "points": [25, 20, 15], "multiplier": 1.5}]}
+# The first tier whose tag the tournament has, or whose minEntrants it reaches, is used, otherwise the default points.
+
+class ScoringRule:
+	__slots__ = ('spec', 'version', 'default', 'tiers')
+
+	def __init__(self, spec):
+		validate(spec)
+		self.spec = spec
+		self.version = json.dumps(spec, sort_keys=True, separators=(',', ':'))	# tournaments cache their points under this
+		if isinstance(spec, list):
+			self.default = spec
+			self.tiers = []
+		else:
+			self.default = spec['points']
+			self.tiers = spec.get('tiers', [])
+
+	@property
+	def flat(self):
+		return len(self.tiers) == 0
+
+	def tier(self, entrants, tags):	# (points per placing, multiplier) for a tournament
+		for tier in self.tiers:
+			if ('tag' in tier and tier['tag'] in tags) or ('minEntrants' in tier and entrants >= tier['minEntrants']):
+				return tier.get('points', self.default), tier.get('multiplier', 1)
+		return self.default, 1
+
+	def points(self, ranks, tags=()):	# points of every placing in ranks, entrants are the placed participants
+		table, multiplier = self.tier(len(ranks), tags)
+		points = []
+		for rank in ranks:
+			if rank <= len(table):
+				value = table[rank - 1] * multiplier
+				if value == int(value):
+					value = int(value)
+				points.append(value)
+			else:
+				points.append(0)
+		return points
+
+def validate(spec):
+	def isPoints(points):
+		return isinstance(points, list) and all(isinstance(p, (int, float)) and not isinstance(p, bool) for p in points)
+	if isPoints(spec):
+		return
+	if not isinstance(spec, dict) or not isPoints(spec.get('points')):
+		raise ValueError('Scoring must be a list of points or an object with a points list')
+	for tier in spec.get('tiers', []):
+		if not isinstance(tier, dict) or ('tag' not in tier and 'minEntrants' not in tier):
+			raise ValueError('Every tier needs a tag or minEntrants')
+		if 'points' in tier and not isPoints(tier['points']):
+			raise ValueError('Tier points must be a list of numbers')
+		if not isinstance(tier.get('multiplier', 1), (int, float)):
+			raise ValueError('Tier multiplier must be a number')
+
+def parseScoring(text):	# "15,12,10" or the json of a tiered scoring
+	text = text.strip()
+	if text.startswith('{'):
+		spec = json.loads(text)
+	else:
+		spec = [int(x) for x in text.strip('[]').replace(' ', '').split(',')]
+	validate(spec)
+	return spec
+
+def scoringText(spec):
+	if isinstance(spec, list):
+		return ','.join(str(x) for x in spec)
+	return json.dumps(spec)
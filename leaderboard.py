@@ -0,0 +1,93 @@
+import time
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant
+from hypestrankings import metrics
+
+PAGE_SIZE = 200
+
+nthDict = {1: '1st', 2: '2nd', 3: '3rd', 4: '4th', 5: '5th', 6: '6th', 7: '7th', 8: '8th', 9: '9th', 10: '10th', 11: '11th', 12: '12th', 13: '13th'}
+
+def placingText(rank):
+	if rank <= 13:
+		return nthDict[rank]
+	modulus = rank % 10
+	if modulus == 1:
+		return '{!s}st'.format(rank)
+	elif modulus == 2:
+		return '{!s}nd'.format(rank)
+	elif modulus == 3:
+		return '{!s}rd'.format(rank)
+	else:
+		return '{!s}th'.format(rank)
+
+class LeaderboardModel(QAbstractTableModel):	# rows are only keys, cell values are looked up when the view asks for them
+	def __init__(self, parent=None):
+		super(LeaderboardModel, self).__init__(parent)
+		self.headers = []
+		self.keys = []
+		self.loaded = 0	# rows handed to the view so far, more are added by fetchMore as it scrolls
+		self.value = None
+		self.display = None
+		
+	def load(self, headers, keys, value, display=None):	# value(key, column) gives the sortable value, display(column, value) its text
+		start = time.perf_counter()
+		self.beginResetModel()
+		self.headers = headers
+		self.keys = list(keys)
+		self.loaded = min(PAGE_SIZE, len(self.keys))
+		self.value = value
+		self.display = display
+		self.endResetModel()
+		metrics.observe('widget_fill_seconds', time.perf_counter() - start, widget='leaderboard')
+		
+	def clear(self):
+		self.load([], [], None)
+		
+	def rowCount(self, parent=QModelIndex()):
+		if parent.isValid():
+			return 0
+		return self.loaded
+		
+	def columnCount(self, parent=QModelIndex()):
+		if parent.isValid():
+			return 0
+		return len(self.headers)
+		
+	def canFetchMore(self, parent=QModelIndex()):
+		return not parent.isValid() and self.loaded < len(self.keys)
+		
+	def fetchMore(self, parent=QModelIndex()):
+		start = time.perf_counter()
+		count = min(PAGE_SIZE, len(self.keys) - self.loaded)
+		self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+		self.loaded += count
+		self.endInsertRows()
+		metrics.observe('widget_fill_seconds', time.perf_counter() - start, widget='leaderboard page')
+		
+	def data(self, index, role=Qt.DisplayRole):
+		if not index.isValid() or index.row() >= self.loaded:
+			return QVariant()
+		if role == Qt.DisplayRole:
+			value = self.value(self.keys[index.row()], index.column())
+			if self.display is not None:
+				return self.display(index.column(), value)
+			return str(value)
+		if role == Qt.TextAlignmentRole and index.column() > 0:
+			return Qt.AlignRight | Qt.AlignVCenter
+		return QVariant()
+		
+	def headerData(self, section, orientation, role=Qt.DisplayRole):
+		if role == Qt.DisplayRole and orientation == Qt.Horizontal and section < len(self.headers):
+			return self.headers[section]
+		if role == Qt.DisplayRole and orientation == Qt.Vertical:
+			return str(section + 1)
+		return QVariant()
+		
+	def sort(self, column, order=Qt.AscendingOrder):	# reorders the keys in place, no rows are rebuilt
+		if self.value is None or column < 0 or column >= len(self.headers):
+			return
+		self.layoutAboutToBeChanged.emit()
+		self.keys.sort(key=lambda key: self.value(key, column), reverse=order == Qt.DescendingOrder)
+		self.layoutChanged.emit()
+		
+	def keyAt(self, row):
+		return self.keys[row]
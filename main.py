@@ -1,142 +1,21 @@
-import challonge
-import config
 import sys
-import pickle
 import os
-import re
-import urllib
-import csv
-import datetime
+import time
+import urllib.error
+import workers
+from leaderboard import LeaderboardModel, placingText
+from hypestrankings import config, metrics
+from hypestrankings.model import (setDict, tournamentDict, newSet, fetchTournaments, checkTournaments,
+	applyRefresh, loadConfig, loadData, saveSnapshots, deleteData, playerPlacements, searchPlayers)
+from hypestrankings.fetch import httpErrorMessage, setCredentials
+from hypestrankings.export import DEFAULT_CSV_PATH, exportCSV
+from hypestrankings.tiers import parseScoring, scoringText
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QDesktopWidget,
 	QAction, qApp, QWidget, QGridLayout, QListWidget, QDialog, QInputDialog, QListWidgetItem,
-	QLineEdit, QLabel, QMessageBox, QComboBox)
+	QLineEdit, QLabel, QMessageBox, QComboBox, QPlainTextEdit, QProgressDialog, QCheckBox, QTableView, QHeaderView, QCompleter)
 from PyQt5.QtGui import QIcon, QCursor
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QStringListModel, QTimer
 
-DEFAULT_SCORING = [15, 12, 10, 8, 5, 5, 3, 3]
-
-DEFAULT_CSV_PATH = os.getcwd().replace('\\', '/') + '/csv/'
-
-setDict = {}
-tournamentDict = {}
-nthDict = {1: '1st', 2: '2nd', 3: '3rd', 4: '4th', 5: '5th', 6: '6th', 7: '7th', 8: '8th', 9: '9th', 10: '10th', 11: '11th', 12: '12th', 13: '13th'}
-
-def saveData():
-	with open('userdata/setlist.pickle', 'wb') as f:
-		pickle.dump(setDict, f, pickle.HIGHEST_PROTOCOL)
-	with open('userdata/tournamentlist.pickle', 'wb') as f:
-		pickle.dump(tournamentDict, f, pickle.HIGHEST_PROTOCOL)
-
-def loadSetDict():
-	if os.path.isfile('userdata/setlist.pickle'):
-		with open('userdata/setlist.pickle', 'rb') as f:
-			return pickle.load(f)
-			
-def loadTournamentDict():
-	if os.path.isfile('userdata/tournamentlist.pickle'):
-		with open('userdata/tournamentlist.pickle', 'rb') as f:
-			return pickle.load(f)
-
-def loadData():
-	global setDict, tournamentDict
-	setDict = loadSetDict()
-	tournamentDict = loadTournamentDict()
-	
-def deleteData():
-	if os.path.isfile('userdata/setlist.pickle'):
-		os.remove('userdata/setlist.pickle')
-	if os.path.isfile('userdata/tournamentlist.pickle'):
-		os.remove('userdata/tournamentlist.pickle')
-		
-def exportCSV(path, filename, set):	# should return false on error, not yet implemented. csv file is also incredibly ugly
-	set.calculateRankings()
-	rankingsList = set.returnRankings()
-	if not os.path.isdir(path):
-		os.makedirs(path)
-	with open(path + filename, 'w+', newline='') as csvfile:
-		fieldnames = ['Player', 'Score']
-		writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-		writer.writerow({'Player': set.name, 'Score': '{!s}'.format(datetime.date.isoformat(datetime.date.today()))}) # must be better way of using multiple columns
-		writer.writerow({'Player': '', 'Score': ''})
-		writer.writeheader()
-		for r in rankingsList:
-			writer.writerow({'Player': r[0], 'Score': r[1]})
-	return True
-				
-class Set:	## add sets with newSet = Set(s); setDict[s] = newSet --- make this a function probably
-	def __init__(self, name):
-		self.name = name
-		self.tournaments = {}
-		self.rankings = {}
-		if 'settings' in config.config and 'scoring' in config.config['settings']:	# ability to set default scoring not yet implemented
-			self.scoring = config.config['settings']['scoring']
-		else:
-			self.scoring = DEFAULT_SCORING
-		saveData()
-		
-	def addTournament(self, url):
-		if url in self.tournaments:
-			raise ValueError('Tournament already exists.')
-		elif url in tournamentDict:
-			self.tournaments[url] = tournamentDict[url]
-		else:
-			self.tournaments[url] = Tournament(url)
-		self.tournaments[url].sets.append(self)
-		saveData()
-		return True
-		
-	def removeTournament(self, url):
-		if url not in self.tournaments:
-			return False
-		else:
-			self.tournaments[url].sets.remove(self)
-			if len(self.tournaments[url].sets) == 0:
-				del tournamentDict[url]
-			del self.tournaments[url]
-		saveData()
-			
-	def removeSet(self):
-		for key, t in self.tournaments.items():
-			t.sets.remove(self)
-			if len(t.sets) == 0:
-				del tournamentDict[t.url]
-		del setDict[self.name]
-		saveData()
-		
-	def calculateRankings(self):
-		self.rankings = {}
-		for key, t in self.tournaments.items():
-			for name, rank in t.participants.items():
-				if name not in self.rankings:
-					self.rankings[name] = 0
-				if rank <= len(self.scoring):
-					self.rankings[name] += self.scoring[rank - 1]
-
-	def returnRankings(self):
-		return sorted(self.rankings.items(), key=lambda x: x[1], reverse=True)
-		
-class Tournament:
-	def __init__(self, url):
-		self.url = url
-		self.sets = []
-		t = challonge.tournaments.show(url)
-		p = challonge.participants.index(t['id'])
-		self.participants = {}
-		for participant in p:
-			if participant['challonge-username'] is not None and participant['final-rank'] is not None:
-				self.participants[participant['challonge-username']] = participant['final-rank']
-		tournamentDict[url] = self
-					
-	def returnResults(self):
-		return sorted(self.participants.items(), key=lambda x: x[1])
-		
-def loadConfig():
-	if config.configExists():
-		config.loadConfig()
-		challonge.set_credentials(config.config['challonge']['username'], config.config['challonge']['apiKey'])
-	else:
-		pass
-		
 class MainWindow(QMainWindow):
 
 	def __init__(self):
@@ -159,6 +38,14 @@ class MainWindow(QMainWindow):
 		settingsAction.setStatusTip('Change settings')
 		settingsAction.triggered.connect(self.settingsActionClicked)
 		
+		refreshAction = QAction(QIcon(''), 'Refresh all tournaments', self)
+		refreshAction.setStatusTip('Fetch results again for tournaments that changed on challonge')
+		refreshAction.triggered.connect(self.refreshActionClicked)
+		
+		diagnosticsAction = QAction(QIcon(''), 'Diagnostics', self)
+		diagnosticsAction.setStatusTip('Show timings of fetching, saving, ranking and filling lists')
+		diagnosticsAction.triggered.connect(self.diagnosticsActionClicked)
+		
 		deleteDataAction = QAction(QIcon(''), 'Delete all data', self)
 		deleteDataAction.setStatusTip('Deletes all tournament and set data')
 		deleteDataAction.triggered.connect(self.deleteDataClicked)
@@ -167,6 +54,8 @@ class MainWindow(QMainWindow):
 		fileMenu = menuBar.addMenu('&File')
 		fileMenu.addAction(challongeLoginAction)
 		fileMenu.addAction(settingsAction)
+		fileMenu.addAction(refreshAction)
+		fileMenu.addAction(diagnosticsAction)
 		fileMenu.addAction(exitAction)
 		fileMenu.addAction(deleteDataAction)
 
@@ -194,11 +83,64 @@ class MainWindow(QMainWindow):
 		settingsDialog = SettingsWindow(self)
 		settingsDialog.show()
 		
+	def diagnosticsActionClicked(self):
+		diagnosticsDialog = DiagnosticsWindow(self)
+		diagnosticsDialog.show()
+		
+	def refreshActionClicked(self):
+		if len(tournamentDict) == 0:
+			return
+		self.progressDialog = QProgressDialog('Checking tournaments...', 'Cancel', 0, len(tournamentDict), self)
+		self.progressDialog.setWindowModality(Qt.WindowModal)
+		self.progressDialog.setMinimumDuration(0)
+		self.progressDialog.setValue(0)
+		def refresh(worker):	# updating the leaderboards recomputes cold sets, so it stays off the gui thread too
+			changed, errors = checkTournaments(progress=worker.progress, cancelled=worker.cancelled)
+			return applyRefresh(changed), errors
+		worker = workers.start(refresh, self.refreshFinished, self.workerError, self.refreshProgress)
+		self.progressDialog.canceled.connect(worker.cancel)
+		
+	def refreshProgress(self, done, total, url):
+		self.progressDialog.setLabelText('Checked {}'.format(url))
+		self.progressDialog.setValue(done)
+		
+	def refreshFinished(self, result):
+		diffs, errors = result
+		self.progressDialog.close()
+		if self.mainWidget.tableRankings.currentResults in setDict:
+			self.mainWidget.btnShowSetRankingsClicked()
+		details = ''
+		changes = 0
+		for name, diff in diffs.items():
+			if len(diff) > 0:
+				details += '{}:\n'.format(name)
+				for player, old, new in diff:
+					details += '  {}: {} -> {}\n'.format(player, old or '-', new or '-')
+				changes += len(diff)
+		for url, e in errors.items():
+			if isinstance(e, urllib.error.HTTPError):
+				details += '{}: {}\n'.format(url, httpErrorMessage(e))
+			else:
+				details += '{}: {}\n'.format(url, str(e))
+		msgBox = QMessageBox(QMessageBox.Information, '',
+			'{} rank changes across {} sets, {} tournaments could not be checked.'.format(changes, len(diffs), len(errors)), QMessageBox.Ok, self)
+		if details != '':
+			msgBox.setDetailedText(details)
+		msgBox.exec_()
+		
+	def workerError(self, e):
+		self.progressDialog.close()
+		errBox = QMessageBox.warning(self, 'Error', str(e))
+		
 	def deleteDataClicked(self):
 		ok = QMessageBox.question(self, '', 'Really delete all set and tournament data?',
 			QMessageBox.Yes, QMessageBox.No)
 		if ok == QMessageBox.Yes:
 			deleteData()
+			self.mainWidget.loadSetList()
+			self.mainWidget.listTournament.clear()
+			self.mainWidget.rankingsModel.clear()
+			self.mainWidget.tableRankings.currentResults = None
 			
 		
 class MainWidget(QWidget):
@@ -214,8 +156,13 @@ class MainWidget(QWidget):
 		
 		self.listTournament = QListWidget(self)
 		
-		self.listRankings = QListWidget(self)
-		self.listRankings.currentResults = None
+		self.rankingsModel = LeaderboardModel(self)
+		self.tableRankings = QTableView(self)
+		self.tableRankings.setModel(self.rankingsModel)
+		self.tableRankings.setSortingEnabled(True)
+		self.tableRankings.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+		self.tableRankings.currentResults = None
+		self.rankingsRequest = 0	# results of older leaderboard requests are dropped when they arrive late
 	
 		btnAddSet = QPushButton('Add Set', self)
 		btnAddSet.clicked.connect(self.btnAddSetClicked)
@@ -235,15 +182,35 @@ class MainWidget(QWidget):
 		btnAddTournament = QPushButton('Add Tournament', self)
 		btnAddTournament.clicked.connect(self.btnAddTournamentClicked)
 		
+		btnBulkAddTournament = QPushButton('Bulk Add Tournaments', self)
+		btnBulkAddTournament.clicked.connect(self.btnBulkAddTournamentClicked)
+		
 		btnRemoveTournament = QPushButton('Remove Tournament', self)
 		btnRemoveTournament.clicked.connect(self.btnRemoveTournamentClicked)
 		
 		btnShowTournamentRankings = QPushButton('Show Tournament Results', self)
 		btnShowTournamentRankings.clicked.connect(self.btnShowTournamentRankingsClicked)
 		
+		btnTagTournament = QPushButton('Tag Tournament', self)
+		btnTagTournament.clicked.connect(self.btnTagTournamentClicked)
+		
 		self.labelRankings = QLabel('', self)
 		self.labelRankings.setMaximumHeight(20)
 		
+		self.searchPlayer = QLineEdit(self)
+		self.searchPlayer.setPlaceholderText('Search player')
+		self.searchPlayer.returnPressed.connect(self.searchPlayerEntered)
+		self.searchPlayer.textEdited.connect(self.searchPlayerEdited)
+		self.playerCompletions = QStringListModel(self)
+		completer = QCompleter(self.playerCompletions, self)
+		completer.setCaseSensitivity(Qt.CaseInsensitive)
+		self.searchPlayer.setCompleter(completer)
+		self.completionTimer = QTimer(self)	# completions are only looked up once typing pauses
+		self.completionTimer.setSingleShot(True)
+		self.completionTimer.setInterval(250)
+		self.completionTimer.timeout.connect(self.completePlayer)
+		self.completionWorker = None	# at most one lookup runs, text typed meanwhile is looked up when it's done
+		
 		grid = QGridLayout()
 		grid.setSpacing(10)
 		
@@ -258,11 +225,14 @@ class MainWidget(QWidget):
 		grid.addWidget(self.listTournament, 1, 2, 5, 1)
 		
 		grid.addWidget(btnAddTournament, 1, 3)
-		grid.addWidget(btnRemoveTournament, 2, 3)
-		grid.addWidget(btnShowTournamentRankings, 3, 3)
+		grid.addWidget(btnBulkAddTournament, 2, 3)
+		grid.addWidget(btnRemoveTournament, 3, 3)
+		grid.addWidget(btnShowTournamentRankings, 4, 3)
+		grid.addWidget(btnTagTournament, 5, 3)
 		
+		grid.addWidget(self.searchPlayer, 0, 0, 1, 4)
 		grid.addWidget(self.labelRankings, 0, 4)
-		grid.addWidget(self.listRankings, 1, 4, 5, 1)
+		grid.addWidget(self.tableRankings, 1, 4, 5, 1)
 				
 		self.setLayout(grid)
 		
@@ -288,10 +258,20 @@ class MainWidget(QWidget):
 						'File already exists, overwrite?', QMessageBox.Yes, QMessageBox.No)
 					if messageBox == QMessageBox.No:
 						return
-				if exportCSV(path, filename, set):
-					msgBox = QMessageBox.information(self, '', '{} exported to file'.format(text))
-				else:
-					msgBox = QMessageBox.warning(self, 'Error', 'Error occurred exporting {}'.format(text))
+				QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
+				
+				def finished(ok):
+					QApplication.restoreOverrideCursor()
+					if ok:
+						msgBox = QMessageBox.information(self, '', '{} exported to file'.format(text))
+					else:
+						msgBox = QMessageBox.warning(self, 'Error', 'Error occurred exporting {}'.format(text))
+						
+				def error(e):
+					QApplication.restoreOverrideCursor()
+					msgBox = QMessageBox.warning(self, 'Error', 'Error occurred exporting {}: {}'.format(text, str(e)))
+					
+				workers.start(lambda worker: exportCSV(path, filename, set), finished, error)
 		
 	def btnRemoveTournamentClicked(self):
 		if self.listTournament.currentItem() and self.listSet.currentItem():
@@ -302,47 +282,151 @@ class MainWidget(QWidget):
 				setDict[self.listSet.currentItem().text()].removeTournament(tournament)
 				rmItem = self.listTournament.takeItem(self.listTournament.currentRow())
 				rmItem = None
-				if self.listRankings.currentResults == tournament:
-					self.listRankings.clear()
-					self.listRankings.currentResults = None
-				elif self.listRankings.currentResults == self.listSet.currentItem().text():
+				if self.tableRankings.currentResults == tournament:
+					self.rankingsModel.clear()
+					self.tableRankings.currentResults = None
+				elif self.tableRankings.currentResults == self.listSet.currentItem().text():
 					self.btnShowSetRankingsClicked()
 		
 	def btnShowSetRankingsClicked(self): # Method may need to be updated when better data persistence implemented
-		self.listRankings.clear()
+		self.rankingsModel.clear()
 		self.labelRankings.setText('')
+		self.rankingsRequest += 1
 		if self.listSet.currentItem():
-			self.labelRankings.setText('Showing leaderboard for set {}'.format(self.listSet.currentItem().text()))
-			setDict[self.listSet.currentItem().text()].calculateRankings()
-			rankingsList = setDict[self.listSet.currentItem().text()].returnRankings()
-			for r in rankingsList:
-				item = '{}: {}'.format(r[0], str(r[1]))
-				self.listRankings.addItem(item)
-			self.listRankings.currentResults = self.listSet.currentItem().text()
-		
-	def btnShowTournamentRankingsClicked(self): # See above. Also formatting of results could be better
-		self.listRankings.clear()
+			name = self.listSet.currentItem().text()
+			request = self.rankingsRequest
+			self.labelRankings.setText('Calculating leaderboard for set {}...'.format(name))
+			self.tableRankings.currentResults = name
+			
+			def finished(rankingsList):
+				if request != self.rankingsRequest:
+					return
+				self.labelRankings.setText('Showing leaderboard for set {}'.format(name))
+				self.showSetLeaderboard(setDict[name], rankingsList)
+					
+			workers.start(lambda worker: setDict[name].returnRankings(), finished, self.rankingsError)
+			
+	def showSetLeaderboard(self, set, rankingsList):
+		def value(name, column):
+			if column == 0:
+				return name
+			stats = set.playerStats(name) or (0, 0, 0)
+			return stats[column - 1]
+				
+		def display(column, value):
+			if column == 3:
+				return placingText(value)
+			return str(value)
+			
+		self.tableRankings.horizontalHeader().setSortIndicator(-1, Qt.DescendingOrder)	# rows arrive in leaderboard order
+		self.rankingsModel.load(['Player', 'Points', 'Events attended', 'Best placing'],
+			[r[0] for r in rankingsList], value, display)
+		
+	def rankingsError(self, e):
+		self.labelRankings.setText('Error: {}'.format(str(e)))
+		
+	def btnShowTournamentRankingsClicked(self): # See above
+		self.rankingsModel.clear()
 		self.labelRankings.setText('')
+		self.rankingsRequest += 1
 		if self.listTournament.currentItem():
 			self.labelRankings.setText('Results for tournament {}'.format(self.listTournament.currentItem().text()))
-			resultsList = tournamentDict[self.listTournament.currentItem().text()].returnResults()
-			for player in resultsList:
-				placing = ''
-				if player[1] <= 13:
-					placing = nthDict[player[1]]
-				else:
-					modulus = player[1] % 10
-					if modulus == 1:
-						placing = '{!s}st'.format(player[1])
-					elif modulus == 2:
-						placing = '{!s}nd'.format(player[1])
-					elif modulus == 3:
-						placing = '{!s}rd'.format(player[1])
-					else:
-						placing = '{!s}th'.format(player[1])
-				item = '{} - {}'.format(placing, player[0])
-				self.listRankings.addItem(item)
-			self.listRankings.currentResults = self.listTournament.currentItem().text()
+			t = tournamentDict[self.listTournament.currentItem().text()]
+			resultsList = t.returnResults()
+			ranks = dict(resultsList)
+			
+			def value(name, column):
+				if column == 0:
+					return ranks[name]
+				return name
+				
+			def display(column, value):
+				if column == 0:
+					return placingText(value)
+				return value
+				
+			self.tableRankings.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+			self.rankingsModel.load(['Placing', 'Player'], [player[0] for player in resultsList], value, display)
+			self.tableRankings.currentResults = self.listTournament.currentItem().text()
+		
+	def searchPlayerEdited(self, text):
+		self.completionTimer.start()
+		
+	def completePlayer(self):
+		text = self.searchPlayer.text().strip()
+		if len(text) < 2 or self.completionWorker is not None:
+			return
+			
+		def finished(matches):
+			self.completionWorker = None
+			if self.searchPlayer.text().strip() == text:
+				self.playerCompletions.setStringList(matches)
+			else:
+				self.completePlayer()
+				
+		def error(e):
+			self.completionWorker = None
+			self.rankingsError(e)
+			
+		self.completionWorker = workers.start(lambda worker: searchPlayers(text), finished, error)
+			
+	def searchPlayerEntered(self):	# every placing of the player across all sets
+		self.rankingsModel.clear()
+		self.rankingsRequest += 1
+		text = self.searchPlayer.text().strip()
+		if text == '':
+			return
+		request = self.rankingsRequest
+		self.labelRankings.setText('Searching for player {}...'.format(text))
+		self.tableRankings.currentResults = None
+		
+		def search(worker):
+			name = text
+			placements = playerPlacements(name)
+			if len(placements) == 0:
+				matches = searchPlayers(name, 1)
+				if len(matches) == 0:
+					return name, []
+				name = matches[0]
+				placements = playerPlacements(name)
+			return name, placements
+			
+		def finished(result):
+			if request != self.rankingsRequest:
+				return
+			name, placements = result
+			if len(placements) == 0:
+				self.labelRankings.setText('No player named {}'.format(text))
+				return
+			best = placingText(placements[0][1])
+			self.labelRankings.setText('{}: {} events attended, best placing {}'.format(name, len(placements), best))
+			ranks = dict(placements)
+			
+			def value(url, column):
+				if column == 0:
+					return ranks[url]
+				elif column == 1:
+					return url
+				return ', '.join(s.name for s in tournamentDict[url].sets)
+				
+			def display(column, value):
+				if column == 0:
+					return placingText(value)
+				return value
+				
+			self.tableRankings.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+			self.rankingsModel.load(['Placing', 'Tournament', 'Sets'], [url for url, rank in placements], value, display)
+			
+		workers.start(search, finished, self.rankingsError)
+		
+	def btnTagTournamentClicked(self):	# tags pick the scoring tier of tiered scorings
+		if self.listTournament.currentItem():
+			t = tournamentDict[self.listTournament.currentItem().text()]
+			text, ok = QInputDialog.getText(self, '', 'Comma separated tags for {}'.format(t.url), QLineEdit.Normal, ', '.join(sorted(t.tags)))
+			if ok:
+				t.setTags([tag.strip() for tag in text.split(',') if tag.strip() != ''])
+				if self.tableRankings.currentResults is not None and self.tableRankings.currentResults in setDict:
+					self.btnShowSetRankingsClicked()
 		
 	def btnRemoveSetClicked(self):
 		if self.listSet.currentItem():
@@ -354,26 +438,36 @@ class MainWidget(QWidget):
 				item = self.listSet.takeItem(self.listSet.currentRow())
 				item = None
 				self.listTournament.clear()
-				self.listRankings.clear()
+				self.rankingsModel.clear()
 			
 	def btnAddTournamentClicked(self):
 		if self.listSet.currentItem():
 			window = AddTournamentWindow(self, self.listSet.currentItem())
 			window.inputTournamentName.setFocus()
 			window.show()
+			
+	def btnBulkAddTournamentClicked(self):
+		if self.listSet.currentItem():
+			window = BulkAddTournamentWindow(self, self.listSet.currentItem())
+			window.inputTournamentNames.setFocus()
+			window.show()
 	
 	def setClicked(self, item):
+		start = time.perf_counter()
 		self.listTournament.clear()
 		set = item.text()
 		for t in setDict[set].tournaments:
 			i = QListWidgetItem(t)
 			self.listTournament.addItem(i)
+		metrics.observe('widget_fill_seconds', time.perf_counter() - start, widget='tournament list')
 		
 	def loadSetList(self):
+		start = time.perf_counter()
 		self.listSet.clear()
 		for s in setDict:
 			item = QListWidgetItem(s)
 			self.listSet.addItem(item)
+		metrics.observe('widget_fill_seconds', time.perf_counter() - start, widget='set list')
 
 	def addToSetList(self, set):
 		item = QListWidgetItem(set.name)
@@ -388,16 +482,12 @@ class MainWidget(QWidget):
 			elif s.replace(' ', '') == '':
 				errBox = QMessageBox.warning(self, 'Error', 'Invalid set name')
 			else:
-				newSet = Set(s)
-				setDict[s] = newSet
-				self.addToSetList(newSet)
-				saveData()
+				self.addToSetList(newSet(s))
 		
 	def btnEditSetClicked(self):
 		if self.listSet.currentItem():
 			editSetDialog = EditSetWindow(self, setDict[self.listSet.currentItem().text()])
 			editSetDialog.show()
-			saveData()
 			
 class AddTournamentWindow(QDialog):
 	def __init__(self, parent, set):
@@ -449,43 +539,117 @@ class AddTournamentWindow(QDialog):
 		self.inputTournamentName.setText(t)
 		
 	def btnOKClicked(self):
+		t = self.inputTournamentName.text()
+		if t in setDict[self.set.text()].tournaments:
+			errBox = QMessageBox.warning(self, 'Error', 'Tournament already exists.')
+			return
 		QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
-		QApplication.processEvents()
+		self.setEnabled(False)
+		workers.start(lambda worker: fetchTournaments([t]), self.fetchFinished, self.fetchError)
+		
+	def fetchFinished(self, result):
+		fetched, errors = result
 		t = self.inputTournamentName.text()
-		try:
-			setDict[self.set.text()].addTournament(t)
-			self.mainWindow.setClicked(self.set)
-			QApplication.restoreOverrideCursor()
-			if self.mainWindow.listRankings.currentResults == self.set.text():
-				self.mainWindow.btnShowSetRankingsClicked()
-			self.close()
-		except urllib.error.HTTPError as e:
-			QApplication.restoreOverrideCursor()
+		QApplication.restoreOverrideCursor()
+		self.setEnabled(True)
+		errors = setDict[self.set.text()].addFetchedTournaments([t], fetched, errors)
+		if t in errors:
+			self.fetchError(errors[t])
+			return
+		self.mainWindow.setClicked(self.set)
+		if self.mainWindow.tableRankings.currentResults == self.set.text():
+			self.mainWindow.btnShowSetRankingsClicked()
+		self.close()
+		
+	def fetchError(self, e):
+		QApplication.restoreOverrideCursor()
+		self.setEnabled(True)
+		if isinstance(e, urllib.error.HTTPError):
 			self.showHTTPError(e)
-		except ValueError as e:
-			QApplication.restoreOverrideCursor()
+		else:
 			errBox = QMessageBox.warning(self, 'Error', str(e))
 			
 	def btnCancelClicked(self):
 		self.close()
 		
 	def showHTTPError(self, err):
-		msg = ''
-		if err.code == 400:
-			msg = 'HTTP Error 400: Bad request. Check URL.'
-		elif err.code == 401:
-			msg = 'HTTP Error 401: Challonge details incorrect or insufficient permissions.'
-		elif err.code == 404:
-			msg = 'HTTP Error 404: Object not found within your challonge account scope. Check URL.'
-		elif err.code == 406:
-			msg = 'HTTP Error 406: Requested format not supported - something has gone horribly wrong.'
-		elif err.code == 422:
-			msg = 'HTTP Error 422: Challonge validation error.'
-		elif err.code == 500:
-			msg = 'HTTP Error 500: Challonge service error.'
-		else:
-			msg = 'Unforeseen error: {}'.format(str(e))
-		errBox = QMessageBox.warning(self, 'Error', msg)
+		errBox = QMessageBox.warning(self, 'Error', httpErrorMessage(err))
+		
+class BulkAddTournamentWindow(QDialog):
+	def __init__(self, parent, set):
+		super(BulkAddTournamentWindow, self).__init__(parent)
+		self.set = set
+		self.mainWindow = parent
+		self.initUI()
+		
+	def initUI(self):
+		self.setWindowTitle('Bulk Add Tournaments')
+		
+		labelTournamentNames = QLabel('Tournament urls, one per line:')
+		
+		self.inputTournamentNames = QPlainTextEdit()
+		
+		btnOK = QPushButton('OK', self)
+		btnOK.clicked.connect(self.btnOKClicked)
+		
+		btnCancel = QPushButton('Cancel', self)
+		btnCancel.clicked.connect(self.btnCancelClicked)
+		
+		self.resize(600, 300)
+		
+		grid = QGridLayout()
+		
+		grid.addWidget(labelTournamentNames, 0, 0, 1, 2)
+		grid.addWidget(self.inputTournamentNames, 1, 0, 1, 2)
+		grid.addWidget(btnOK, 2, 0)
+		grid.addWidget(btnCancel, 2, 1)
+		
+		self.setLayout(grid)
+		
+	def btnOKClicked(self):
+		urls = []
+		for line in self.inputTournamentNames.toPlainText().splitlines():
+			if line.strip() != '':
+				urls.append(line.strip())
+		if len(urls) == 0:
+			return
+		self.urls = urls
+		self.progressDialog = QProgressDialog('Adding tournaments...', 'Cancel', 0, len(urls), self)
+		self.progressDialog.setWindowModality(Qt.WindowModal)
+		self.progressDialog.setMinimumDuration(0)
+		self.progressDialog.setValue(0)
+		worker = workers.start(lambda worker: fetchTournaments(urls, worker.progress, cancelled=worker.cancelled),
+			self.fetchFinished, self.fetchError, self.fetchProgress)
+		self.progressDialog.canceled.connect(worker.cancel)
+		
+	def fetchProgress(self, done, total, url):
+		self.progressDialog.setMaximum(total)
+		self.progressDialog.setLabelText('Fetched {}'.format(url))
+		self.progressDialog.setValue(done)
+		
+	def fetchFinished(self, result):
+		fetched, errors = result
+		self.progressDialog.close()
+		errors = setDict[self.set.text()].addFetchedTournaments(self.urls, fetched, errors)
+		self.mainWindow.setClicked(self.set)
+		if self.mainWindow.tableRankings.currentResults == self.set.text():
+			self.mainWindow.btnShowSetRankingsClicked()
+		if len(errors) > 0:
+			msg = '{} of {} tournaments could not be added:\n'.format(len(errors), len(self.urls))
+			for url, e in errors.items():
+				if isinstance(e, urllib.error.HTTPError):
+					msg += '\n{}: {}'.format(url, httpErrorMessage(e))
+				else:
+					msg += '\n{}: {}'.format(url, str(e))
+			errBox = QMessageBox.warning(self, 'Error', msg)
+		self.close()
+		
+	def fetchError(self, e):
+		self.progressDialog.close()
+		errBox = QMessageBox.warning(self, 'Error', str(e))
+		
+	def btnCancelClicked(self):
+		self.close()
 		
 class EditSetWindow(QDialog):
 	def __init__(self, parent, set):
@@ -505,7 +669,7 @@ class EditSetWindow(QDialog):
 		self.inputScoring = QLineEdit()
 		
 		self.inputName.setText(self.set.name)
-		self.inputScoring.setText(str(self.set.scoring))
+		self.inputScoring.setText(scoringText(self.set.scoring))
 		
 		btnSetName = QPushButton('OK', self)
 		btnSetName.clicked.connect(self.btnSetNameClicked)
@@ -541,35 +705,90 @@ class EditSetWindow(QDialog):
 			self.inputName.setText(self.set.name)
 			errBox = QMessageBox.warning(self, 'Error', 'Invalid set name')
 		else:
-			del setDict[self.set.name]	# double check effect of this method on tournament.sets
-			self.set.name = self.inputName.text()
-			setDict[self.set.name] = self.set
+			self.set.rename(self.inputName.text())
 			self.mainWidget.loadSetList()
-			saveData()
 		
 		
-	def btnSetScoringClicked(self):
-		input = self.inputScoring.text()
-		if input == '':
-			self.inputScoring.setText(str(self.set.scoring))
-			errBox = QMessageBox.warning(self, 'Error', 'Invalid input')
-		input = re.sub(r'[\[\]]|\s+', '', input)
-		input = input.split(',')
-		scoring = []
+	def btnSetScoringClicked(self):	# comma separated points, or the json of a tiered scoring
 		try:
-			for x in input:
-				scoring.append(int(x))
-			self.set.scoring = scoring
-			saveData()
-			if self.mainWidget.listRankings.currentResults == self.set.name:
+			self.set.setScoring(parseScoring(self.inputScoring.text()))
+			if self.mainWidget.tableRankings.currentResults == self.set.name:
 				self.mainWidget.btnShowSetRankingsClicked()
 		except ValueError:
-			self.inputScoring.setText(str(self.set.scoring))
+			self.inputScoring.setText(scoringText(self.set.scoring))
 			errBox = QMessageBox.warning(self, 'Error', 'Invalid input')
 		
 	def btnDoneClicked(self):
 		self.close()
 			
+class DiagnosticsWindow(QDialog):	# counts and timings recorded since the app started
+	def __init__(self, parent):
+		super(DiagnosticsWindow, self).__init__(parent)
+		
+		self.initUI()
+		
+	def initUI(self):
+		self.setWindowTitle('Diagnostics')
+		
+		self.model = LeaderboardModel(self)
+		tableMetrics = QTableView(self)
+		tableMetrics.setModel(self.model)
+		tableMetrics.setSortingEnabled(True)
+		tableMetrics.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+		
+		btnRefresh = QPushButton('Refresh', self)
+		btnRefresh.clicked.connect(self.loadMetrics)
+		
+		btnReset = QPushButton('Reset', self)
+		btnReset.clicked.connect(self.btnResetClicked)
+		
+		btnCopy = QPushButton('Copy as JSON', self)
+		btnCopy.clicked.connect(self.btnCopyClicked)
+		
+		btnDone = QPushButton('Done', self)
+		btnDone.clicked.connect(self.close)
+		
+		self.resize(800, 400)
+		
+		grid = QGridLayout()
+		grid.addWidget(tableMetrics, 0, 0, 1, 4)
+		grid.addWidget(btnRefresh, 1, 0)
+		grid.addWidget(btnReset, 1, 1)
+		grid.addWidget(btnCopy, 1, 2)
+		grid.addWidget(btnDone, 1, 3)
+		self.setLayout(grid)
+		
+		self.loadMetrics()
+		
+	def loadMetrics(self):
+		snapshot = metrics.snapshot()
+		rows = []
+		for t in snapshot['timings']:
+			rows.append((t['name'], t['labels'], t['count'], t['total'] * 1000, t['total'] * 1000 / t['count'], t['max'] * 1000))
+		for c in snapshot['counters']:
+			rows.append((c['name'], c['labels'], c['value'], None, None, None))
+			
+		def value(row, column):
+			if column == 1:
+				return ', '.join('{}={}'.format(key, v) for key, v in sorted(row[1].items()))
+			if row[column] is None:
+				return -1
+			return row[column]
+			
+		def display(column, value):
+			if column >= 3:
+				return '' if value < 0 else '{:.1f}'.format(value)
+			return str(value)
+			
+		self.model.load(['Metric', 'Labels', 'Count', 'Total ms', 'Mean ms', 'Max ms'], rows, value, display)
+		
+	def btnResetClicked(self):
+		metrics.reset()
+		self.loadMetrics()
+		
+	def btnCopyClicked(self):
+		QApplication.clipboard().setText(metrics.toJSON())
+		
 class ChallongeLoginWindow(QDialog):
 
 	def __init__(self, parent):
@@ -618,7 +837,7 @@ class ChallongeLoginWindow(QDialog):
 		
 	def btnOKClicked(self):
 		config.setConfigChallonge(self.inputUsername.text(), self.inputApi.text())
-		challonge.set_credentials(self.inputUsername.text(), self.inputApi.text())
+		setCredentials(self.inputUsername.text(), self.inputApi.text())
 		self.close()
 	
 	def btnCancelClicked(self):
@@ -643,6 +862,14 @@ class SettingsWindow(QDialog):
 		
 		labelCSVPath = QLabel('Default folder for CSV files')
 		
+		self.checkLazyLoad = QCheckBox('Load tournament results on demand (takes effect on restart)')
+		self.checkLazyLoad.setChecked(config.lazyLoad())
+		
+		labelProfiler = QLabel('Profile background tasks into userdata/profiles')
+		self.comboProfiler = QComboBox()
+		self.comboProfiler.addItems(['off', 'cprofile', 'pyinstrument'])
+		self.comboProfiler.setCurrentText(config.profiler())
+		
 		self.inputCSVPath = QLineEdit()
 		if 'settings' in config.config and 'csvpath' in config.config['settings']:
 			self.inputCSVPath.setText(config.config['settings']['csvpath'])
@@ -662,13 +889,20 @@ class SettingsWindow(QDialog):
 		grid.addWidget(labelCSVPath, 0, 0)
 		grid.addWidget(self.inputCSVPath, 0, 1)
 		
-		grid.addWidget(btnSave, 1, 0)
-		grid.addWidget(btnCancel, 1, 1)
+		grid.addWidget(self.checkLazyLoad, 1, 0, 1, 2)
+		
+		grid.addWidget(labelProfiler, 2, 0)
+		grid.addWidget(self.comboProfiler, 2, 1)
+		
+		grid.addWidget(btnSave, 3, 0)
+		grid.addWidget(btnCancel, 3, 1)
 		
 		self.setLayout(grid)
 		
 	def btnSaveClicked(self):
 		config.setConfigCSVPath(self.inputCSVPath.text())
+		config.setLazyLoad(self.checkLazyLoad.isChecked())
+		config.setProfiler(self.comboProfiler.currentText())
 		self.close()
 		
 	def btnCancelClicked(self):
@@ -678,7 +912,7 @@ if __name__ == '__main__':
 
 	app = QApplication(sys.argv)	
 	loadConfig()
-	if os.path.isfile('userdata/setlist.pickle'):
-		loadData()
+	loadData()
+	app.aboutToQuit.connect(saveSnapshots)	# snapshots sets changed since their leaderboard was last shown
 	w = MainWindow()	
 	sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,52 @@
+import threading
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from hypestrankings import metrics
+
+running = set()	# keeps workers and their signals alive until they've reported back
+
+class WorkerSignals(QObject):
+	progress = pyqtSignal(int, int, str)	# done, total, url
+	finished = pyqtSignal(object)
+	error = pyqtSignal(object)
+
+class Worker(QRunnable):	# runs function(worker) on the global thread pool, results come back to the GUI thread through signals
+	def __init__(self, function):
+		super(Worker, self).__init__()
+		self.function = function
+		self.signals = WorkerSignals()
+		self.cancelEvent = threading.Event()
+		self.signals.finished.connect(self.done)
+		self.signals.error.connect(self.done)
+		
+	def run(self):
+		try:
+			with metrics.profile('worker'):	# the profiler picked in the settings only sees this thread
+				result = self.function(self)
+		except Exception as e:
+			self.signals.error.emit(e)
+		else:
+			self.signals.finished.emit(result)
+			
+	def done(self, result):
+		running.discard(self)
+		
+	def progress(self, url, error, done, total):	# matches the progress callbacks of the model functions
+		self.signals.progress.emit(done, total, url)
+		
+	def cancel(self):
+		self.cancelEvent.set()
+		
+	def cancelled(self):
+		return self.cancelEvent.is_set()
+		
+def start(function, finished=None, error=None, progress=None):
+	worker = Worker(function)
+	if finished is not None:
+		worker.signals.finished.connect(finished)
+	if error is not None:
+		worker.signals.error.connect(error)
+	if progress is not None:
+		worker.signals.progress.connect(progress)
+	running.add(worker)
+	QThreadPool.globalInstance().start(worker)
+	return worker